@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de la lectura de resultados de SQL Server.
+
+Compara la conversión original (``fetchall`` + una tupla por fila +
+``pd.DataFrame``) con ``fetch_frame`` (``fetchmany`` + columnas de Arrow) sobre
+un cursor sintético con las columnas de ``full_alarm_details``. Mide tiempo y
+pico de memoria: el de Python (tracemalloc) y, aparte, el de los buffers de
+Arrow, que tracemalloc no ve.
+
+Uso: python -m benchmarks.fetch --rows 1000000 --batch-size 10000
+"""
+import argparse
+import datetime
+import random
+import timeit
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+
+from src.databases.fetch import fetch_frame
+
+DESCRIPTION = [
+    ("EntityID", int), ("AlarmDate", datetime.datetime), ("DateInserted", datetime.datetime),
+    ("DateUpdated", datetime.datetime), ("AlarmStatus", int), ("AlarmType", int),
+    ("AlarmName", str), ("Priority", int),
+]
+
+
+class SyntheticCursor:
+    """Cursor con la interfaz de pyodbc que devuelve filas ya generadas."""
+    def __init__(self, rows: list[tuple]) -> None:
+        self.description = [(name, type_code, None, None, None, None, True) for name, type_code in DESCRIPTION]
+        self._rows = rows
+        self._position = 0
+
+    def fetchall(self) -> list[tuple]:
+        return self.fetchmany(len(self._rows))
+
+    def fetchmany(self, size: int) -> list[tuple]:
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+
+def synthetic_rows(count: int, seed: int = 0) -> list[tuple]:
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 8, 1)
+    names = [f"AIE: Rule {i}" for i in range(200)]
+    return [
+        (rng.randint(1, 50), start + datetime.timedelta(seconds=i), start + datetime.timedelta(seconds=i + 1),
+         start + datetime.timedelta(seconds=i + 60), rng.randint(0, 9), rng.randint(1, 3), rng.choice(names), rng.randint(1, 100))
+        for i in range(count)
+    ]
+
+
+def legacy(cursor) -> pd.DataFrame:
+    data = cursor.fetchall()
+    columns = [column[0] for column in cursor.description]
+    return pd.DataFrame([tuple(row) for row in data], columns=columns)
+
+
+def measure(func, rows: list[tuple], repeat: int) -> dict:
+    best = min(timeit.repeat(lambda: func(SyntheticCursor(rows)), number=1, repeat=repeat))
+    default_pool = pa.default_memory_pool()
+    arrow_pool = pa.proxy_memory_pool(default_pool)
+    pa.set_memory_pool(arrow_pool)
+    tracemalloc.start()
+    try:
+        func(SyntheticCursor(rows))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(default_pool)
+    return {"best_s": round(best, 3), "python_peak_mb": round(peak / 2**20, 1), "arrow_peak_mb": round(arrow_pool.max_memory() / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de fetch_frame frente a fetchall + tuplas")
+    parser.add_argument('--rows', type=int, default=1_000_000, help='número de filas del cursor sintético')
+    parser.add_argument('--batch-size', type=int, default=10_000, help='filas por fetchmany')
+    parser.add_argument('--repeat', type=int, default=3, help='número de repeticiones')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    pd.testing.assert_frame_equal(fetch_frame(SyntheticCursor(rows), args.batch_size), legacy(SyntheticCursor(rows)), check_dtype=False)
+
+    results = [
+        {"method": "fetchall + tuplas", **measure(legacy, rows, args.repeat)},
+        {"method": "fetch_frame", **measure(lambda cursor: fetch_frame(cursor, args.batch_size), rows, args.repeat)},
+    ]
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
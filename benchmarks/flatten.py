@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark del aplanado de agregaciones de tipo 3 (terms + date_histogram).
+
+Compara la implementación original basada en ``iterrows`` + ``pd.concat`` con
+``flatten_buckets`` sobre una respuesta sintética.
+
+Uso: python -m benchmarks.flatten --outer 500 --inner 720
+"""
+import argparse
+import random
+import timeit
+
+import pandas as pd
+
+from src.databases.elastic.flatten import flatten_buckets
+
+TYPE_3_FIELDS = {"key_as_string": (1, "key_as_string"), "key": (0, "key"), "doc_count": (0, "doc_count")}
+
+
+def legacy_type_3(aggregations: dict) -> pd.DataFrame:
+    df = pd.DataFrame([bucket for agg in aggregations.values() if 'buckets' in agg for bucket in agg['buckets']])
+    expanded = []
+    for _, row in df.iterrows():
+        if 'date_histogram' in row and row['date_histogram']:
+            hist_df = pd.DataFrame(row['date_histogram']['buckets'])
+            hist_df['key'] = row['key']
+            hist_df['doc_count'] = row['doc_count']
+            expanded.append(hist_df)
+    return pd.concat(expanded, ignore_index=True)[['key_as_string', 'key', 'doc_count']]
+
+
+def synthetic_aggregations(outer: int, inner: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    start = 1722470400000
+    return {"msg_class_name": {"buckets": [
+        {
+            "key": f"class-{i}",
+            "doc_count": rng.randint(1, 100_000),
+            "date_histogram": {"buckets": [
+                {"key_as_string": f"{start + j * 3_600_000}", "key": start + j * 3_600_000, "doc_count": rng.randint(1, 500)}
+                for j in range(inner)
+            ]},
+        }
+        for i in range(outer)
+    ]}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de flatten_buckets frente a iterrows + concat")
+    parser.add_argument('--outer', type=int, default=500, help='número de buckets externos (terms)')
+    parser.add_argument('--inner', type=int, default=720, help='número de buckets del histograma por bucket externo')
+    parser.add_argument('--repeat', type=int, default=3, help='número de repeticiones')
+    args = parser.parse_args()
+
+    aggregations = synthetic_aggregations(args.outer, args.inner)
+    pd.testing.assert_frame_equal(flatten_buckets(aggregations, ("date_histogram",), TYPE_3_FIELDS), legacy_type_3(aggregations))
+
+    legacy = min(timeit.repeat(lambda: legacy_type_3(aggregations), number=1, repeat=args.repeat))
+    current = min(timeit.repeat(lambda: flatten_buckets(aggregations, ("date_histogram",), TYPE_3_FIELDS), number=1, repeat=args.repeat))
+    print(f"type_3   filas={args.outer * args.inner:>8}  original={legacy:8.3f}s  flatten_buckets={current:8.3f}s  x{legacy / current:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de la normalización de valores de Elastic.
+
+Compara la implementación original basada en ``df.apply(col.map(...))`` con
+``normalize_frame`` sobre respuestas sintéticas de hits y de agregaciones.
+
+Uso: python -m benchmarks.normalize --rows 200000 --repeat 3
+"""
+import argparse
+import ast
+import random
+import timeit
+
+import pandas as pd
+
+from src.databases.elastic.normalize import normalize_frame, rename_duplicate_columns
+
+
+def legacy_normalize(df: pd.DataFrame) -> pd.DataFrame:
+    def deserialize(x):
+        if isinstance(x, str):
+            try:
+                return ast.literal_eval(x)
+            except (ValueError, SyntaxError):
+                pass
+        return x
+
+    df = df.apply(lambda col: col.map(lambda x: x[0] if isinstance(x, list) and len(x) == 1 else x))
+    df.columns = rename_duplicate_columns(df.columns)
+    df = df.apply(lambda col: col.map(deserialize))
+    return df.apply(lambda col: col.map(lambda x: x['value'] if isinstance(x, dict) and 'value' in x else x))
+
+
+def synthetic_hits(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    classes = ["Attack", "Audit", "Operations", "Security", "Compromise", "Reconnaissance"]
+    hits = []
+    for i in range(rows):
+        hits.append({
+            "msgClassName": rng.choice(classes),
+            "logSourceName": f"host-{rng.randint(1, 500)}.corp.local",
+            "originIp": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "priority": rng.randint(1, 100),
+            "impactedPort": str(rng.choice([22, 80, 443, 3389])),
+            "tags": str([rng.choice(classes)]),
+            "normalDate": [f"2024-08-{rng.randint(1, 31):02d}T{rng.randint(0, 23):02d}:00:00.000Z"],
+            "entityId": [rng.randint(1, 20)],
+            "score": {"value": rng.random()},
+        })
+    return pd.DataFrame(hits)
+
+
+def synthetic_buckets(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    buckets = [
+        {"key": f"class-{i}", "doc_count": rng.randint(1, 10_000), "avg_priority": {"value": rng.random() * 100}}
+        for i in range(rows)
+    ]
+    return pd.DataFrame(buckets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de normalize_frame frente a la implementación original")
+    parser.add_argument('--rows', type=int, default=200_000, help='número de filas sintéticas')
+    parser.add_argument('--repeat', type=int, default=3, help='número de repeticiones por caso')
+    args = parser.parse_args()
+
+    for name, df in (("hits", synthetic_hits(args.rows)), ("buckets", synthetic_buckets(args.rows))):
+        expected = legacy_normalize(df.copy())
+        pd.testing.assert_frame_equal(normalize_frame(df.copy()), expected, check_dtype=False)
+
+        legacy = min(timeit.repeat(lambda: legacy_normalize(df.copy()), number=1, repeat=args.repeat))
+        current = min(timeit.repeat(lambda: normalize_frame(df.copy()), number=1, repeat=args.repeat))
+        print(f"{name:<8} filas={len(df):>8}  original={legacy:8.3f}s  normalize_frame={current:8.3f}s  x{legacy / current:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
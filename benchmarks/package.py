@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de ``Package.run()`` contra el sustituto local de Elasticsearch.
+
+Mide, para cada tipo de resultado (hits, agregaciones de tipo 1, 2 y 3 y
+paginación composite) y cada tamaño, el rendimiento en ejecuciones y filas por
+segundo y el pico de memoria de una ejecución. Las respuestas se generan y se
+serializan una sola vez, así que solo se mide el trabajo del cliente:
+deserialización, aplanado y normalización.
+
+Con ``--folder`` se miden además las consultas de esa carpeta.
+
+Uso: python -m benchmarks.package --sizes 100,1000,10000
+"""
+import argparse
+import statistics
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.databases.elastic import Elastic
+from src.databases.elastic.package import Package
+from .standin import StandIn, attach
+
+RANGE = {"range": {"normalDate": {"gte": 1722470400000, "lte": 1725062400000, "format": "epoch_millis"}}}
+
+
+def hits_query(size: int) -> dict:
+    return {"size": size, "sort": [{"normalDate": {"order": "desc"}}], "query": {"bool": {"must": [RANGE]}}}
+
+
+def terms_query(size: int, sub_aggs: dict | None = None) -> dict:
+    terms = {"terms": {"field": "msgClassName", "size": size, "order": {"_count": "desc"}}}
+    if sub_aggs:
+        terms["aggs"] = sub_aggs
+    return {"size": 0, "query": {"bool": {"must": [RANGE]}}, "aggs": {"msg_class_name": terms}}
+
+
+# Tipo -> (consulta, result_processing, parámetros del sustituto) para un tamaño N.
+KINDS = {
+    "hits": lambda n: (hits_query(n), {"columns": ["normalDate", "msgClassName", "priority", "originHostName"]}, {"hits": n}),
+    "type_1": lambda n: (terms_query(n, {"latest": {"top_hits": {"size": 1, "_source": {"includes": ["normalDate", "originHostName", "impactedIp"]}}}}), {"columns": []}, {"buckets": n}),
+    "type_2": lambda n: (terms_query(n), {"columns": ["msgClassName", "count"]}, {"buckets": n}),
+    "type_2_composite": lambda n: (terms_query(n), {"columns": ["msgClassName", "count"], "complete_buckets": True}, {"buckets": n}),
+    "type_3": lambda n: (terms_query(10, {"date_histogram": {"date_histogram": {"field": "normalDate", "interval": "1h", "min_doc_count": 1}}}), {"columns": ["msgClassName", "normalDate"]}, {"buckets": 10, "histogram_buckets": max(1, n // 10)}),
+}
+
+
+def package_data(kind: str, query: dict, result_processing: dict) -> dict:
+    return {
+        "id": f"benchmark_{kind}",
+        "metadata": {"name": f"Benchmark {kind}"},
+        "processing_policy": {"mode": "single", "index": ["logs-*"]},
+        "query": query,
+        "result_processing": result_processing,
+    }
+
+
+def measure(package: Package, repeat: int) -> dict:
+    # La primera ejecución genera y memoriza la respuesta en el sustituto.
+    df = package.run()
+    times = timeit.repeat(package.run, number=1, repeat=repeat)
+
+    tracemalloc.start()
+    package.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "rows": len(df),
+        "response_bytes": package.stats().get("response_bytes"),
+        "best_ms": round(best * 1000, 2),
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "runs_per_s": round(1 / best, 1),
+        "rows_per_s": round(len(df) / best),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def synthetic(sizes: list[int], kinds: list[str], repeat: int) -> list[dict]:
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            query, result_processing, standin_options = KINDS[kind](size)
+            elastic = attach(Elastic(), StandIn(**standin_options))
+            package = Package(elastic, package_data(kind, query, result_processing))
+            results.append({"package": kind, "size": size, **measure(package, repeat)})
+    return results
+
+
+def folder(path: str, size: int, repeat: int) -> list[dict]:
+    elastic = attach(Elastic(), StandIn(buckets=size, hits=size, histogram_buckets=max(1, size // 10)))
+    end = datetime(2024, 9, 1)
+    elastic.set_date_range(end - timedelta(days=30), end)
+    elastic.set_entity_ids(pd.DataFrame({"EntityID": [1, 2, 3]}))
+    return [{"package": package._id, "size": size, **measure(package, repeat)} for package in elastic.load_queries(path)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de Package.run() contra el sustituto local de Elasticsearch")
+    parser.add_argument('--sizes', default="100,1000,10000", help='tamaños (buckets o hits) separados por comas')
+    parser.add_argument('--kinds', default=",".join(KINDS), help='tipos de resultado separados por comas')
+    parser.add_argument('--repeat', type=int, default=5, help='número de repeticiones')
+    parser.add_argument('--folder', help='carpeta de consultas a medir además de los tipos sintéticos')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = synthetic(sizes, args.kinds.split(","), args.repeat)
+    if args.folder:
+        results += [row for size in sizes for row in folder(args.folder, size, args.repeat)]
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
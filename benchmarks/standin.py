@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sustituto local de Elasticsearch para pruebas y benchmarks sin clúster.
+
+``StandIn`` responde ``_search``, ``_msearch``, ``_count`` y ``scroll`` con
+respuestas grabadas o generadas a partir del cuerpo de la consulta, escaladas
+a N buckets o N hits. Se puede usar de dos formas:
+
+* Por HTTP: ``python -m benchmarks.standin --port 9200 --buckets 1000``
+* En el mismo proceso, sin sockets: ``attach(elastic, StandIn(...))`` reemplaza
+  el cliente de una instancia de ``Elastic`` por uno que usa ``StandInConnection``.
+
+Las respuestas grabadas son archivos JSON en una carpeta. Una consulta con
+agregaciones usa ``<nombres de las agregaciones unidos por '+'>.json`` y una
+consulta sin agregaciones usa ``hits.json``. Si no hay grabación para una
+consulta, la respuesta se genera.
+"""
+import os
+import re
+import gzip
+import json
+import glob
+import uuid
+import random
+import argparse
+import threading
+from fnmatch import fnmatchcase
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from elasticsearch import Elasticsearch
+from elasticsearch.connection import Connection
+
+from src.databases.elastic.telemetry import ResponseSizeSerializer
+
+HISTOGRAM_START = 1722484800000
+INTERVAL_UNITS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000, "M": 2_592_000_000, "q": 7_776_000_000, "y": 31_536_000_000}
+SINGLE_BUCKET_AGGS = ("filter", "sampler", "random_sampler", "diversified_sampler", "global", "nested", "reverse_nested", "missing")
+METRIC_AGGS = ("value_count", "cardinality", "sum", "avg", "min", "max")
+DEFAULT_FIELDS = ["normalDate", "msgClassName", "priority", "entityId", "originHostName", "impactedIp"]
+
+_MISSING = object()
+
+
+class StandIn:
+    """
+    Genera respuestas de Elasticsearch 6.x. Las respuestas de ``_search`` son
+    deterministas y se memorizan ya serializadas, de modo que en un benchmark
+    solo se mide el trabajo del cliente.
+
+    :param buckets: Buckets por agregación de buckets (las terms se limitan a su ``size``).
+    :param hits: Total de documentos que coinciden con cualquier consulta.
+    :param histogram_buckets: Buckets de los histogramas; por defecto ``buckets``.
+    :param recorded: Carpeta con respuestas grabadas.
+    :param scale_recorded: Escalar las respuestas grabadas a ``buckets``/``hits``.
+    """
+    def __init__(self, buckets: int = 100, hits: int = 100, histogram_buckets: int | None = None, recorded: str | None = None, scale_recorded: bool = True, seed: int = 0) -> None:
+        self.buckets = buckets
+        self.hits = hits
+        self.histogram_buckets = histogram_buckets or buckets
+        self.scale_recorded = scale_recorded
+        self.seed = seed
+        self.requests = 0
+        self._recorded = self._load_recorded(recorded) if recorded else {}
+        self._responses: dict[tuple, str] = {}
+        self._scrolls: dict[str, tuple[dict, int]] = {}
+        self._lock = threading.Lock()
+
+    def handle(self, method: str, url: str, params: dict | None = None, body: bytes | str | None = None) -> tuple[int, str]:
+        """
+        Atiende una petición HTTP ya separada en método, ruta, parámetros y
+        cuerpo, y devuelve el código de estado y el JSON de la respuesta.
+        """
+        parts = urlsplit(url)
+        params = {**dict(parse_qsl(parts.query)), **{key: value.decode("utf-8") if isinstance(value, bytes) else str(value) for key, value in (params or {}).items()}}
+        path = parts.path.rstrip("/")
+        text = body.decode("utf-8") if isinstance(body, bytes) else body
+        with self._lock:
+            self.requests += 1
+
+        if path.endswith("/_search/scroll") or path == "/_search/scroll":
+            if method == "DELETE":
+                return 200, json.dumps({"succeeded": True, "num_freed": 1})
+            data = json.loads(text) if text else {}
+            return 200, json.dumps(self.scroll(data.get("scroll_id") or params.get("scroll_id")))
+        if path.endswith("/_msearch"):
+            return 200, self._memoized(("msearch", text, params.get("filter_path")), lambda: self.msearch(text, params))
+        if path.endswith("/_search"):
+            data = json.loads(text) if text else {}
+            if "scroll" in params:
+                return 200, json.dumps(self.search(data, params))
+            return 200, self._memoized(("search", text, params.get("filter_path")), lambda: self.search(data, params))
+        if path.endswith("/_count"):
+            return 200, json.dumps({"count": self.hits, "_shards": self._shards()})
+        if path == "" or path == "/":
+            return 200, json.dumps({"name": "standin", "cluster_name": "standin", "version": {"number": "6.8.1"}, "tagline": "You Know, for Search"})
+        if path.startswith("/_nodes"):
+            return 200, json.dumps({"nodes": {}})
+        return 404, json.dumps({"error": f"no handler found for uri [{path}] and method [{method}]", "status": 404})
+
+    def search(self, body: dict, params: dict | None = None) -> dict:
+        params = params or {}
+        response = self._recorded_response(body)
+        if response is None:
+            rng = random.Random(self.seed)
+            response = {"took": 1, "timed_out": False, "_shards": self._shards(), "hits": self._hits(body, rng)}
+            # min_score con random_score equivale a muestrear con probabilidad 1 - min_score.
+            matched = max(1, round(self.hits * (1 - body["min_score"]))) if "min_score" in body else self.hits
+            response["hits"]["total"] = matched
+            aggs = body.get("aggs", body.get("aggregations"))
+            if aggs:
+                response["aggregations"] = self._aggregations(aggs, rng, matched)
+
+        if "scroll" in params:
+            scroll_id = uuid.uuid4().hex
+            with self._lock:
+                self._scrolls[scroll_id] = (body, len(response["hits"]["hits"]))
+            response["_scroll_id"] = scroll_id
+        return apply_filter_path(response, params.get("filter_path"))
+
+    def msearch(self, text: str, params: dict | None = None) -> dict:
+        lines = [json.loads(line) for line in text.splitlines() if line.strip()]
+        bodies = lines[1::2]
+        responses = [{**self.search(body), "status": 200} for body in bodies]
+        return apply_filter_path({"took": 1, "responses": responses}, (params or {}).get("filter_path"))
+
+    def scroll(self, scroll_id: str) -> dict:
+        with self._lock:
+            body, offset = self._scrolls.get(scroll_id, ({}, self.hits))
+        size = body.get("size", 10)
+        hits = [self._hit(position, self._source_fields(body), body) for position in range(offset, min(offset + size, self.hits))]
+        with self._lock:
+            self._scrolls[scroll_id] = (body, offset + len(hits))
+        return {"_scroll_id": scroll_id, "took": 1, "timed_out": False, "_shards": self._shards(), "hits": {"total": self.hits, "max_score": None, "hits": hits}}
+
+    def _memoized(self, key: tuple, build) -> str:
+        with self._lock:
+            cached = self._responses.get(key)
+        if cached is None:
+            cached = json.dumps(build())
+            with self._lock:
+                self._responses[key] = cached
+        return cached
+
+    def _shards(self) -> dict:
+        return {"total": 5, "successful": 5, "skipped": 0, "failed": 0}
+
+    def _hits(self, body: dict, rng: random.Random) -> dict:
+        size = min(body.get("size", 10), self.hits)
+        fields = self._source_fields(body)
+        return {"total": self.hits, "max_score": None, "hits": [self._hit(position, fields, body, rng) for position in range(size)]}
+
+    def _source_fields(self, body: dict) -> list[str]:
+        source = body.get("_source", True)
+        if isinstance(source, dict) and source.get("includes"):
+            return list(source["includes"])
+        if isinstance(source, list) and source:
+            return source
+        return DEFAULT_FIELDS
+
+    def _hit(self, position: int, fields: list[str], body: dict, rng: random.Random | None = None) -> dict:
+        rng = rng or random.Random(self.seed + position)
+        hit = {
+            "_index": "logs-standin",
+            "_type": "doc",
+            "_id": str(position),
+            "_score": None,
+            "_source": {field: _field_value(field, position, rng) for field in fields},
+            "sort": [HISTOGRAM_START - position * 1000],
+        }
+        docvalue_fields = body.get("docvalue_fields")
+        if docvalue_fields:
+            names = [field["field"] if isinstance(field, dict) else field for field in docvalue_fields]
+            hit["fields"] = {name: [_field_value(name, position, rng)] for name in names}
+        return hit
+
+    def _aggregations(self, aggs: dict, rng: random.Random, doc_count: int) -> dict:
+        return {name: self._aggregation(agg, rng, doc_count) for name, agg in aggs.items()}
+
+    def _aggregation(self, agg: dict, rng: random.Random, doc_count: int) -> dict:
+        sub_aggs = agg.get("aggs", agg.get("aggregations"))
+
+        def bucket(key, count: int, **extra) -> dict:
+            result = {"key": key, **extra, "doc_count": count}
+            if sub_aggs:
+                result.update(self._aggregations(sub_aggs, rng, count))
+            return result
+
+        if "terms" in agg:
+            terms = agg["terms"]
+            size = min(terms.get("size", 10), self.buckets)
+            counts = sorted((rng.randint(1, max(1, doc_count)) for _ in range(size)), reverse=True)
+            return {"doc_count_error_upper_bound": 0, "sum_other_doc_count": 0,
+                    "buckets": [bucket(_field_value(terms.get("field", "key"), i, rng, distinct=True), count) for i, count in enumerate(counts)]}
+
+        if "date_histogram" in agg:
+            histogram = agg["date_histogram"]
+            step = _interval_millis(histogram.get("fixed_interval") or histogram.get("calendar_interval") or histogram.get("interval") or "1h")
+            buckets = []
+            for i in range(self.histogram_buckets):
+                key = HISTOGRAM_START + i * step
+                key_as_string = datetime.fromtimestamp(key / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+                buckets.append(bucket(key, rng.randint(1, 500), key_as_string=key_as_string))
+            return {"buckets": buckets}
+
+        if "histogram" in agg:
+            step = agg["histogram"].get("interval", 1)
+            return {"buckets": [bucket(float(i * step), rng.randint(1, 500)) for i in range(self.histogram_buckets)]}
+
+        if "composite" in agg:
+            return self._composite(agg["composite"], bucket, rng)
+
+        if "filters" in agg:
+            filters = agg["filters"].get("filters", {})
+            if isinstance(filters, dict):
+                return {"buckets": {name: {k: v for k, v in bucket(name, rng.randint(1, 500)).items() if k != "key"} for name in filters}}
+            return {"buckets": [{k: v for k, v in bucket(i, rng.randint(1, 500)).items() if k != "key"} for i in range(len(filters))]}
+
+        if "top_hits" in agg:
+            top_hits = agg["top_hits"]
+            size = min(top_hits.get("size", 3), self.hits)
+            fields = self._source_fields(top_hits)
+            return {"hits": {"total": doc_count, "max_score": None, "hits": [self._hit(i, fields, top_hits, rng) for i in range(size)]}}
+
+        for kind in SINGLE_BUCKET_AGGS:
+            if kind in agg:
+                count = doc_count if kind in ("global", "nested", "reverse_nested") else max(1, doc_count // 2)
+                return {k: v for k, v in bucket(None, count).items() if k != "key"}
+
+        for kind in METRIC_AGGS:
+            if kind in agg:
+                return {"value": float(rng.randint(0, max(1, doc_count)))}
+
+        if "stats" in agg:
+            return {"count": doc_count, "min": 0.0, "max": float(doc_count), "avg": doc_count / 2, "sum": float(doc_count * doc_count / 2)}
+
+        return {}
+
+    def _composite(self, composite: dict, bucket, rng: random.Random) -> dict:
+        source_name, source = next(iter(composite["sources"][0].items()))
+        field = next(iter(source.values())).get("field", source_name)
+        after = composite.get("after")
+        start = _key_position(after[source_name]) + 1 if after else 0
+        end = min(start + composite.get("size", 10), self.buckets)
+
+        buckets = [bucket({source_name: _field_value(field, i, rng, distinct=True)}, rng.randint(1, 500)) for i in range(start, end)]
+        result = {"buckets": buckets}
+        if buckets:
+            result["after_key"] = buckets[-1]["key"]
+        return result
+
+    def _recorded_response(self, body: dict) -> dict | None:
+        aggs = body.get("aggs", body.get("aggregations"))
+        recorded = self._recorded.get("+".join(sorted(aggs)) if aggs else "hits")
+        if recorded is None:
+            return None
+        response = json.loads(recorded)
+        if self.scale_recorded:
+            hits = response.get("hits", {})
+            if hits.get("hits"):
+                hits["hits"] = _cycle(hits["hits"], min(body.get("size", 10), self.hits), "_id")
+                hits["total"] = self.hits
+            for agg in response.get("aggregations", {}).values():
+                if isinstance(agg, dict) and isinstance(agg.get("buckets"), list) and agg["buckets"]:
+                    agg["buckets"] = _cycle(agg["buckets"], self.buckets, "key")
+        return response
+
+    def _load_recorded(self, folder: str) -> dict[str, str]:
+        recorded = {}
+        for file in glob.glob(os.path.join(folder, "*.json")):
+            with open(file, "r", encoding="utf-8") as f:
+                recorded[os.path.splitext(os.path.basename(file))[0]] = f.read()
+        return recorded
+
+
+class StandInConnection(Connection):
+    """
+    Conexión del cliente de Elasticsearch que entrega las peticiones a un
+    ``StandIn`` en el mismo proceso, sin abrir sockets.
+    """
+    def __init__(self, host: str = "standin", port: int | None = None, standin: StandIn | None = None, **kwargs) -> None:
+        super().__init__(host=host, port=port, **kwargs)
+        self.standin = standin or StandIn()
+
+    def perform_request(self, method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        status, data = self.standin.handle(method, self.url_prefix + url, params, body)
+        if not (200 <= status < 300) and status not in ignore:
+            self._raise_error(status, data)
+        return status, {"content-type": "application/json"}, data
+
+
+def client(standin: StandIn, **kwargs) -> Elasticsearch:
+    return Elasticsearch([{"host": "standin"}], connection_class=StandInConnection, standin=standin, serializer=ResponseSizeSerializer(), **kwargs)
+
+
+def attach(elastic, standin: StandIn):
+    """
+    Reemplaza el cliente de una instancia de ``Elastic`` por uno conectado al
+    sustituto. Se debe llamar antes de crear los paquetes.
+    """
+    elastic._es = client(standin)
+    return elastic
+
+
+def serve(standin: StandIn, host: str = "127.0.0.1", port: int = 9200) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self):
+            length = int(self.headers.get("content-length") or 0)
+            body = self.rfile.read(length) if length else None
+            if body and self.headers.get("content-encoding") == "gzip":
+                body = gzip.decompress(body)
+
+            status, data = standin.handle(self.command, self.path, None, body)
+            payload = data.encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", "application/json; charset=UTF-8")
+            if "gzip" in (self.headers.get("accept-encoding") or ""):
+                payload = gzip.compress(payload, compresslevel=1)
+                self.send_header("content-encoding", "gzip")
+            self.send_header("content-length", str(len(payload)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _respond
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def apply_filter_path(response: dict, filter_path: str | None) -> dict:
+    """
+    Aplica ``filter_path`` como lo hace Elasticsearch (rutas separadas por
+    comas, comodín ``*`` por segmento, las listas se recorren elemento a elemento).
+    """
+    if not filter_path:
+        return response
+    filtered = _filter(response, [path.split(".") for path in filter_path.split(",") if path])
+    return {} if filtered is _MISSING else filtered
+
+
+def _filter(node, patterns: list[list[str]]):
+    if any(not pattern for pattern in patterns):
+        return node
+    if isinstance(node, list):
+        items = [_filter(item, patterns) for item in node]
+        items = [item for item in items if item is not _MISSING]
+        return items if items else _MISSING
+    if not isinstance(node, dict):
+        return _MISSING
+
+    result = {}
+    for key, value in node.items():
+        matching = [pattern[1:] for pattern in patterns if fnmatchcase(key, pattern[0])]
+        if matching:
+            filtered = _filter(value, matching)
+            if filtered is not _MISSING:
+                result[key] = filtered
+    return result if result else _MISSING
+
+
+def _field_value(field: str, position: int, rng: random.Random, distinct: bool = False):
+    name = field.lower()
+    if "date" in name:
+        return HISTOGRAM_START - position * 60_000
+    if "priority" in name or name.endswith("id"):
+        return position if distinct else rng.randint(1, 100)
+    if name.endswith("ip"):
+        return f"10.{position // 65536 % 256}.{position // 256 % 256}.{position % 256}"
+    return f"{field}-{position}"
+
+
+def _interval_millis(interval: str) -> int:
+    match = re.fullmatch(r"(\d*)(ms|[smhdwMqy])", str(interval).strip())
+    if match is None:
+        named = {"minute": "m", "hour": "h", "day": "d", "week": "w", "month": "M", "quarter": "q", "year": "y"}
+        return INTERVAL_UNITS[named.get(interval, "h")]
+    return int(match.group(1) or 1) * INTERVAL_UNITS[match.group(2)]
+
+
+def _key_position(key) -> int:
+    if isinstance(key, (int, float)):
+        return int(key)
+    match = re.search(r"(\d+)$", str(key))
+    return int(match.group(1)) if match else 0
+
+
+def _cycle(items: list, size: int, key: str) -> list:
+    result = []
+    for i in range(size):
+        item = dict(items[i % len(items)])
+        if i >= len(items):
+            item[key] = f"{item.get(key)}#{i // len(items)}"
+        result.append(item)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustituto local de Elasticsearch con respuestas grabadas o sintéticas")
+    parser.add_argument('--host', default="127.0.0.1", help='dirección de escucha')
+    parser.add_argument('--port', type=int, default=9200, help='puerto de escucha')
+    parser.add_argument('--buckets', type=int, default=100, help='buckets por agregación')
+    parser.add_argument('--histogram-buckets', type=int, help='buckets por histograma')
+    parser.add_argument('--hits', type=int, default=100, help='documentos que coinciden con cada consulta')
+    parser.add_argument('--recorded', help='carpeta con respuestas grabadas')
+    parser.add_argument('--no-scale', action='store_true', help='devolver las respuestas grabadas sin escalar')
+    args = parser.parse_args()
+
+    standin = StandIn(args.buckets, args.hits, args.histogram_buckets, args.recorded, not args.no_scale)
+    server = serve(standin, args.host, args.port)
+    print(f"Sirviendo en http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
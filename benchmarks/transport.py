@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Medición del transporte HTTP del cliente de Elastic.
+
+Ejecuta las consultas de una carpeta contra un clúster real con y sin
+compresión gzip y muestra, por configuración, los bytes recibidos del socket,
+los bytes JSON decodificados y el tiempo total.
+
+Uso: python -m benchmarks.transport --host http://siem:9200 --entities 1,2 --days 30
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.databases.elastic import Elastic
+
+
+def measure(args: argparse.Namespace, http_compress: bool) -> dict:
+    elastic = Elastic(args.host, max_workers=args.workers, http_compress=http_compress, pool_maxsize=args.pool_size, keep_alive=not args.no_keep_alive)
+    end = datetime.now()
+    elastic.set_date_range(end - timedelta(days=args.days), end)
+    elastic.set_entity_ids(pd.DataFrame({"EntityID": args.entities.split(",")}))
+
+    try:
+        queries = elastic.load_queries(args.folder)
+        start = time.perf_counter()
+        elastic.run_queries(queries)
+        elapsed = time.perf_counter() - start
+    finally:
+        elastic.close()
+
+    summary = elastic.telemetry.summary()
+    return {
+        "http_compress": http_compress,
+        "queries": summary["queries"],
+        "errors": summary["errors"],
+        "wire_bytes": summary["wire_bytes"],
+        "response_bytes": summary["response_bytes"],
+        "ratio": summary["response_bytes"] / summary["wire_bytes"] if summary["wire_bytes"] else None,
+        "took_ms": summary["took"],
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparación del transporte de Elastic con y sin compresión")
+    parser.add_argument('--host', default="http://localhost:9200", help='URL del clúster de Elastic')
+    parser.add_argument('--folder', default="./querys/elastic", help='carpeta con las consultas')
+    parser.add_argument('--entities', required=True, help='Entity IDs separados por comas')
+    parser.add_argument('--days', type=int, default=30, help='días hacia atrás del rango de fechas')
+    parser.add_argument('--workers', type=int, default=4, help='número de hilos')
+    parser.add_argument('--pool-size', type=int, help='número máximo de conexiones HTTP')
+    parser.add_argument('--no-keep-alive', action='store_true', help='cerrar la conexión después de cada petición')
+    parser.add_argument('--repeat', type=int, default=3, help='número de repeticiones por configuración')
+    args = parser.parse_args()
+
+    results = [measure(args, http_compress) for _ in range(args.repeat) for http_compress in (False, True)]
+    print(pd.DataFrame(results).groupby("http_compress").median().to_string())
+
+
+if __name__ == "__main__":
+    main()
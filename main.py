@@ -5,6 +5,7 @@ import sys
 from src.cli import parse_arguments
 from src.utils.logger import configure_logger, logging
 from src.app import run_interactive_mode, run_main_program, Config
+from src.databases import configure_pool
 
 # Verificar si la versión de Python es 3.10 o superior
 if sys.version_info < (3, 10):
@@ -15,6 +16,7 @@ def main():
     # sys.argv.append("-devi")
     args = parse_arguments()
     logger = configure_logger(args.debug, args.verbose)
+    configure_pool(max_size=args.sql_pool_size)
     # Configuración por defecto (modo debug)
     config = Config.default()
 
@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
 import json
+import os
 
 from .cli.questions import (
     select_entities,
@@ -10,7 +11,7 @@ from .cli.questions import (
     get_output_details,
 )
 
-from src.databases import MSQLServer, Elastic
+from src.databases import MSQLServer, Elastic, AsyncElastic, ResultCache, PartialStore, QueryBudget, close_pool
 from .templates import Templates
 
 from .utils.constants import DEFAULT_SIGNATURE
@@ -108,8 +109,15 @@ def run_main_program(args, config: Config):
 
     # Inicialización de Elastic y MSQLServer
     logger.info("Inicializando Elastic y MSQLServer...")
-    elastic = Elastic()
-    database = MSQLServer()
+    slice_window = timedelta(days=args.slice_days) if args.slice_days else None
+    cache = ResultCache() if args.cache else None
+    elastic_class = AsyncElastic if args.use_async else Elastic
+    budget = QueryBudget(args.max_docs, args.max_buckets, args.on_exceed) if args.max_docs or args.max_buckets else None
+    elastic_partials = PartialStore("./output/partials", settle=timedelta(days=args.settle_days)) if args.incremental else None
+    sql_partials = PartialStore("./output/partials", settle=timedelta(days=args.sql_settle_days)) if args.incremental else None
+    elastic = elastic_class(max_workers=args.workers, batch_msearch=args.msearch, stream_hits=args.stream, slice_window=slice_window, cache=cache, partials=elastic_partials, histogram_buckets=args.histogram_buckets, draft=args.draft, budget=budget,
+                            http_compress=args.compress, pool_maxsize=args.pool_size, keep_alive=args.keep_alive, sniff=args.sniff)
+    database = MSQLServer(partials=sql_partials, fetch_size=args.sql_fetch_size)
 
     # Establecer el rango de fechas en las instancias de Elastic y MSQLServer
     start, end = config.date_range
@@ -128,8 +136,12 @@ def run_main_program(args, config: Config):
     queries = elastic.load_queries("./querys/elastic")
     
     if args.export:
-        elastic.export_to_csv("./querys/elastic", "./output/csv")
-        database.export_to_csv("./output/csv")
+        export_dir = os.path.join("./output", args.export_format)
+        elastic.export("./querys/elastic", export_dir, args.export_format, args.row_group_size)
+        database.export(export_dir, args.export_format, args.row_group_size, args.sql_fetch_size)
+
+    elastic.close()
+    close_pool()
 
     signature = config.signature
 
@@ -142,3 +154,10 @@ def run_main_program(args, config: Config):
     templates.templates.get("general").build()
 
     print("✅ [Reporte generado]\nRuta de salida del archivo:", config.output_file)
+
+    telemetry_file = elastic.telemetry.write(
+        f"{os.path.splitext(config.output_file)[0]}.telemetry.json",
+        date_range=[start.isoformat(), end.isoformat()],
+        entity_ids=config.entities['EntityID'].tolist(),
+    )
+    logger.info("Métricas de las consultas de Elastic guardadas en %s", telemetry_file)
@@ -12,6 +12,28 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument('-d', '--debug', action='store_true', help='activar modo debug')
     parser.add_argument('-v', '--verbose', action='store_true', help='activar salida detallada')
     parser.add_argument('-e', '--export', action='store_true', help='activar salida csv')
+    parser.add_argument('--export-format', choices=['csv', 'parquet', 'feather'], default='csv', help='formato de los archivos exportados')
+    parser.add_argument('--row-group-size', type=int, default=100_000, help='filas por grupo al exportar a Parquet o Feather')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='número máximo de consultas de Elastic en paralelo')
+    parser.add_argument('--msearch', action='store_true', help='agrupar las consultas de Elastic en una sola petición _msearch')
+    parser.add_argument('--stream', action='store_true', help='exportar las consultas de hits por bloques recorriendo todos los resultados')
+    parser.add_argument('--slice-days', type=int, help='dividir el rango de fechas en ventanas de N días consultadas en paralelo')
+    parser.add_argument('--cache', action='store_true', help='guardar y reutilizar los resultados de Elastic en ./output/cache')
+    parser.add_argument('--incremental', action='store_true', help='guardar resultados parciales por día en ./output/partials y consultar solo los días que faltan')
+    parser.add_argument('--settle-days', type=int, default=2, help='días tras los cuales un parcial de Elastic se considera definitivo')
+    parser.add_argument('--sql-settle-days', type=int, default=30, help='días tras los cuales un parcial de SQL Server se considera definitivo (las alarmas cambian de estado)')
+    parser.add_argument('--histogram-buckets', type=int, help='número aproximado de buckets de los histogramas de Elastic (el intervalo se elige según el rango de fechas)')
+    parser.add_argument('--draft', nargs='?', type=float, const=0.1, help='borrador rápido: calcular las agregaciones de Elastic sobre una muestra aleatoria (probabilidad, 0.1 por defecto) con conteos aproximados')
+    parser.add_argument('--max-docs', type=int, help='presupuesto: documentos que puede recorrer cada consulta de Elastic (se estima antes de ejecutarla)')
+    parser.add_argument('--max-buckets', type=int, help='presupuesto: buckets que puede devolver cada consulta de agregaciones de Elastic')
+    parser.add_argument('--on-exceed', choices=['reject', 'sample'], default='reject', help='qué hacer con las consultas que superan el presupuesto: descartarlas o ejecutarlas sobre una muestra')
+    parser.add_argument('--sql-pool-size', type=int, default=4, help='número máximo de conexiones abiertas con SQL Server')
+    parser.add_argument('--sql-fetch-size', type=int, default=10_000, help='filas que se leen de SQL Server en cada bloque')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='ejecutar las consultas de Elastic sobre un event loop de asyncio (el cliente asíncrono se instala con requirements-async.txt)')
+    parser.add_argument('--compress', action='store_true', help='usar compresión gzip en las peticiones y respuestas de Elastic')
+    parser.add_argument('--pool-size', type=int, help='número máximo de conexiones HTTP abiertas con Elastic')
+    parser.add_argument('--no-keep-alive', dest='keep_alive', action='store_false', help='cerrar la conexión HTTP con Elastic después de cada petición')
+    parser.add_argument('--sniff', action='store_true', help='descubrir los nodos del clúster de Elastic (requiere que sean accesibles desde este equipo)')
     
     if not len(sys.argv) > 1:
         parser.print_help()
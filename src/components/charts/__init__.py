@@ -156,15 +156,16 @@ class Line(BaseChart):
         plt.tight_layout()
 
 class Historigram(BaseChart):
-    def __init__(self, df: pd.DataFrame, x_col: str, y_col: str, freq: str = "1H", rotation: bool = True, title: Optional[str] = None, xlabel: Optional[str] = None, ylabel: Optional[str] = 'Count', show_legend: bool = True, grid: bool = True, axis_labels: bool = True) -> None:
+    def __init__(self, df: pd.DataFrame, x_col: str, y_col: str, freq: Optional[str] = None, rotation: bool = True, title: Optional[str] = None, xlabel: Optional[str] = None, ylabel: Optional[str] = 'Count', show_legend: bool = True, grid: bool = True, axis_labels: bool = True) -> None:
         super().__init__()
         
         # Asegurarse de que la columna de fecha sea datetime
         df[x_col] = pd.to_datetime(df[x_col])
         
-        # Agrupar los datos según la frecuencia
+        # Agrupar los datos según la frecuencia. Sin frecuencia se usan los
+        # buckets tal como llegan de Elastic, cuyo intervalo ya depende del rango.
         df.set_index(x_col, inplace=True)
-        df_resampled = df.resample(freq).sum(numeric_only=True).reset_index()
+        df_resampled = df.resample(freq).sum(numeric_only=True).reset_index() if freq else df.reset_index()
 
         colors = ['#1f77b4']  # Paleta de colores simple
 
@@ -1,3 +1,8 @@
 from .msql import MSQLServer
 from .elastic import Elastic
+from .elastic.asynchronous import AsyncElastic
+from .elastic.cache import ResultCache
+from .elastic.preflight import QueryBudget
 from .elastic.package import Package
+from .partials import PartialStore
+from .pool import ConnectionPool, configure_pool, close_pool
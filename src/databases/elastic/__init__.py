@@ -1,24 +1,59 @@
 import os
-import glob
-import json
 import pandas as pd
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from elasticsearch import Elasticsearch
 
 from src.utils.logger import get_logger
 from .package import Package
+from .executor import PackageExecutor
+from .slicing import split_epoch_range, merge_slices
+from .cache import ResultCache
+from .template import QueryTemplate, histogram_interval
+from .registry import QueryRegistry
+from .telemetry import Telemetry, ResponseSizeSerializer, MeasuredConnection
+from .preflight import QueryBudget, needs_probe, probe_body, estimate_cost
+from src.databases.export import write_chunks
+from src.databases.partials import PartialStore, split_days
 
 class Elastic:
-    def __init__(self, host: str = "http://localhost:9200", timeout: int = 30, max_retries: int = 10, retry_on_timeout: bool = True) -> None:
+    def __init__(self, host: str = "http://localhost:9200", timeout: int = 30, max_retries: int = 10, retry_on_timeout: bool = True, max_workers: int = 4, batch_msearch: bool = False, stream_hits: bool = False, slice_window: timedelta | None = None, cache: ResultCache | None = None, partials: PartialStore | None = None, histogram_buckets: int | None = None, draft: float | None = None, budget: QueryBudget | None = None,
+                 http_compress: bool = False, pool_maxsize: int | None = None, keep_alive: bool = True, sniff: bool = False, sniffer_timeout: int | None = None) -> None:
         self._es = Elasticsearch(
             [host],
             timeout=timeout,
             max_retries=max_retries,
-            retry_on_timeout=retry_on_timeout
+            retry_on_timeout=retry_on_timeout,
+            serializer=ResponseSizeSerializer(),
+            connection_class=MeasuredConnection,
+            # Compresión gzip de peticiones y respuestas
+            http_compress=http_compress,
+            # Una conexión por hilo como mínimo para no descartar conexiones del pool
+            maxsize=pool_maxsize or max(10, max_workers),
+            headers=None if keep_alive else {"connection": "close"},
+            # Descubrimiento de nodos del clúster
+            sniff_on_start=sniff,
+            sniff_on_connection_fail=sniff,
+            sniffer_timeout=sniffer_timeout if sniff else None
         )
         self._date_range = None
         self._entity_ids = None
+        self._max_workers = max_workers
+        self._batch_msearch = batch_msearch
+        self._stream_hits = stream_hits
+        self._slice_window = slice_window
+        self._cache = cache
+        self._partials = partials
+        self._histogram_buckets = histogram_buckets
+        if draft is not None and not 0 < draft <= 1:
+            raise ValueError("La probabilidad del modo borrador debe estar entre 0 y 1")
+        self._draft = draft
+        self._budget = budget
+        self._registries: dict[str, QueryRegistry] = {}
+        self.telemetry = Telemetry()
         self.logger = get_logger()
+        if draft is not None:
+            self.logger.warning(f"Modo borrador: las agregaciones se calculan sobre una muestra del {draft:.0%} y los conteos son aproximados.")
     
     def set_date_range(self, start_date: datetime, end_date: datetime) -> None:
         self._date_range = (start_date, end_date)
@@ -28,87 +63,314 @@ class Elastic:
             raise ValueError("entity_ids debe ser un DataFrame de pandas")
         self._entity_ids = entity_ids
 
+    def close(self) -> None:
+        self._es.transport.close()
+
     def export_to_csv(self, directory: str, output: str) -> None:
+        self.export(directory, output, "csv")
+
+    def export(self, directory: str, output: str, format: str = "csv", row_group_size: int = 100_000, compression: str | None = None) -> None:
+        """
+        Exporta el resultado de cada consulta de la carpeta a CSV, Parquet o
+        Feather. Con ``stream_hits`` las consultas de hits se escriben por
+        bloques a medida que llegan las páginas, sin reunirlas en memoria.
+        """
         if not os.path.exists(output):
             os.makedirs(output, True)
         
         queries = self.load_queries(directory)
+        streamed = [query for query in queries if self._stream_hits and query.is_streamable()]
+        streamed, rejected = self.preflight(streamed)
+        for query in streamed:
+            self.logger.info(f"Exportando {query._name} por bloques")
+            path = os.path.join(output, f"{query._name}_elastic")
+            try:
+                write_chunks((chunk for chunk in query.stream() if not chunk.empty), path, format, row_group_size, compression)
+            except ValueError as e:
+                self.logger.error(f"No se pudo exportar {query._name}: {e}")
+
+        queries = [query for query in queries if query not in streamed and query not in rejected]
+        results = self.run_queries(queries)
         for query in queries:
-            df = query.run()
+            df = results[query._id]
             if not df.empty:
                 self.logger.info(f"Exportando {query._name}")
-                file_name = f"{query._name}_elastic.csv"
-                df.to_csv(os.path.join(output, file_name), index=False)
+                write_chunks([df], os.path.join(output, f"{query._name}_elastic"), format, row_group_size, compression)
+
+    def run_queries(self, queries: list['Package'], max_workers: int | None = None, batch_msearch: bool | None = None) -> dict[str, pd.DataFrame]:
+        planned, rejected = self.preflight(queries, max_workers)
+        results = self._run_queries(planned, max_workers, batch_msearch)
+        results.update({query._id: pd.DataFrame() for query in rejected})
+        return {query._id: results.get(query._id, pd.DataFrame()) for query in queries}
+
+    def preflight(self, queries: list['Package'], max_workers: int | None = None) -> tuple[list['Package'], list['Package']]:
+        """
+        Estima el costo de cada paquete con una consulta ``size: 0`` (documentos
+        que coinciden y cardinalidad de los campos terms) antes de ejecutarlo y
+        aplica el presupuesto. Devuelve los paquetes a ejecutar, con los que
+        superan el límite ya convertidos a muestreo, y los rechazados.
+
+        No se estiman los paquetes que ya están en la caché. En modo incremental
+        los paquetes combinables se estiman en ``run_incremental``, solo por los
+        días que faltan. Si la estimación falla el paquete se ejecuta igualmente.
+        """
+        if self._budget is None or not queries:
+            return queries, []
+
+        incremental = self._partials is not None and self._date_range
+        targets = [query for query in queries if not (incremental and query.is_mergeable())]
+        budgeted = dict(zip(map(id, targets), self._apply_budget(targets, max_workers)))
+
+        planned, rejected = [], []
+        for query in queries:
+            if id(query) not in budgeted:
+                planned.append(query)
+            elif budgeted[id(query)] is None:
+                rejected.append(query)
+            else:
+                planned.append(budgeted[id(query)])
+        return planned, rejected
+
+    def _apply_budget(self, queries: list['Package'], max_workers: int | None = None) -> list['Package | None']:
+        """
+        Devuelve, en el mismo orden, el paquete a ejecutar (el original o su
+        versión muestreada) o None si se rechaza.
+        """
+        probed = [query for query in queries if needs_probe(query) and not query.is_cached()]
+        estimates = {}
+        if probed:
+            with ThreadPoolExecutor(max_workers=min(max_workers or self._max_workers, len(probed)), thread_name_prefix="preflight") as pool:
+                estimates = dict(zip(map(id, probed), pool.map(self._estimate, probed)))
+
+        budgeted = []
+        for query in queries:
+            estimate = estimates.get(id(query))
+            if estimate is None:
+                budgeted.append(query)
+                continue
+
+            action, probability = self._budget.evaluate(estimate, query.is_sampleable())
+            if action == "sample":
+                self.logger.warning(f"{query._name} supera el presupuesto ({estimate['docs']} documentos), se ejecutará sobre una muestra del {probability:.1%}")
+                if query._template:
+                    query = self._build_package(query._template, query._date_range, complete_buckets=query._complete_buckets, draft=probability)
+            elif action == "reject":
+                self.logger.warning(f"{query._name} supera el presupuesto ({estimate['docs']} documentos, {estimate['buckets']} buckets) y no se ejecutará")
+
+            query._preflight = {**estimate, "action": action, "sample_probability": probability}
+            if action == "reject":
+                self.telemetry.record({"id": query._id, "name": query._name, "date_range": [query._date_range.get("gte"), query._date_range.get("lte")], "rejected": True, "preflight": query._preflight})
+                budgeted.append(None)
+            else:
+                budgeted.append(query)
+        return budgeted
+
+    def _estimate(self, query: 'Package') -> dict | None:
+        try:
+            response = self._es.search(index=query._format_index(), body=probe_body(query), filter_path="took,hits.total,aggregations.*.value")
+        except Exception as e:
+            self.logger.warning(f"No se pudo estimar el costo de {query._id}: {e}")
+            return None
+        estimate = estimate_cost(query, response)
+        estimate["probe_took"] = response.get("took")
+        self.logger.debug(f"Estimación de {query._id}: {estimate}")
+        return estimate
+
+    def _run_queries(self, queries: list['Package'], max_workers: int | None = None, batch_msearch: bool | None = None) -> dict[str, pd.DataFrame]:
+        executor = PackageExecutor(max_workers or self._max_workers)
+        if self._partials is not None and self._date_range:
+            return self.run_incremental(queries, max_workers)
+        if self._slice_window and self._spans_multiple_windows(self._slice_window):
+            return self.run_sliced(queries, self._slice_window, max_workers)
+
+        batch_msearch = self._batch_msearch if batch_msearch is None else batch_msearch
+        if not batch_msearch:
+            return executor.run(queries)
+
+        results = self.run_msearch([query for query in queries if query.is_batchable()])
+        results.update(executor.run([query for query in queries if not query.is_batchable()]))
+        return {query._id: results.get(query._id, pd.DataFrame()) for query in queries}
+
+    def run_sliced(self, queries: list['Package'], window: timedelta, max_workers: int | None = None) -> dict[str, pd.DataFrame]:
+        """
+        Ejecuta cada paquete combinable por ventanas de ``window`` en paralelo y
+        combina los resultados. Los que no se pueden combinar de forma exacta
+        (top_hits, hits, varias agregaciones) se ejecutan sobre el rango completo.
+        """
+        date_range = self._get_epoch_millis_range()
+        windows = split_epoch_range(date_range, int(window.total_seconds() * 1000))
+        self.logger.debug(f"Dividiendo el rango de fechas en {len(windows)} ventanas de {window}")
+
+        slices = {}
+        for query in queries:
+            if not query.is_mergeable():
+                slices[query._id] = None
+                continue
+            # Cada ventana trae todos los términos; el top-N se calcula al combinar.
+            complete_buckets = query._terms_aggregation() is not None
+            slices[query._id] = [self._build_package(query._template, window_range, complete_buckets=complete_buckets, draft=query._draft) for window_range in windows]
+            for package in slices[query._id]:
+                package._preflight = query._preflight
+
+        packages = [package for query in queries for package in (slices[query._id] or [query])]
+        frames = iter(PackageExecutor(max_workers or self._max_workers).map(packages))
+
+        results = {}
+        for query in queries:
+            group = slices[query._id]
+            if group is None:
+                results[query._id] = next(frames)
+                continue
+            partials = [next(frames) for _ in group]
+            results[query._id] = query.truncate_terms(merge_slices(query.merge_kind(), partials, query.total_key()))
+        return results
+
+    def run_incremental(self, queries: list['Package'], max_workers: int | None = None) -> dict[str, pd.DataFrame]:
+        """
+        Ejecuta cada paquete combinable día por día. Los días definitivos se
+        leen del almacén de parciales si ya existen y se guardan al consultarlos;
+        solo se consultan los días que faltan o que aún pueden cambiar.
+        """
+        days = split_days(*self._date_range)
+        date_range = self._get_epoch_millis_range()
+
+        plans = {}
+        pending = []
+        for query in queries:
+            if not query.is_mergeable():
+                plans[query._id] = None
+                pending.append(query)
+                continue
+
+            entries = []
+            for day_start, day_end in days:
+                day_range = {**date_range, "gte": self._convert_to_epoch_millis(day_start), "lte": self._convert_to_epoch_millis(day_end)}
+                package = self._build_package(query._template, day_range, complete_buckets=query._terms_aggregation() is not None, draft=query._draft)
+                key = {"id": package._id, "query": package._query}
+                final = self._partials.is_final(day_end)
+                stored = self._partials.get("elastic", key) if final else None
+                entries.append([package, key, final, stored])
+            plans[query._id] = entries
+
+        stored_days = sum(1 for entries in plans.values() if entries for entry in entries if entry[3] is not None)
+        # El presupuesto solo se aplica a los días que hay que consultar.
+        missing = [(query_id, entry) for query_id, entries in plans.items() if entries for entry in entries if entry[3] is None]
+        day_packages = [entry[0] for _, entry in missing]
+        budgeted = self._apply_budget(day_packages, max_workers) if self._budget else day_packages
+        # Un día fuera del presupuesto dejaría incompleto el resultado: se rechaza el paquete.
+        rejected = {query_id for (query_id, _), package in zip(missing, budgeted) if package is None}
+        for (query_id, entry), package in zip(missing, budgeted):
+            if query_id in rejected:
+                continue
+            if package is not entry[0]:
+                # Un día muestreado no se guarda como parcial de la consulta exacta.
+                entry[0], entry[2] = package, False
+            pending.append(package)
+
+        self.logger.debug(f"Modo incremental: {stored_days} días leídos de los parciales, {len(pending)} consultas pendientes")
+        frames = dict(zip(map(id, pending), PackageExecutor(max_workers or self._max_workers).map(pending)))
+
+        results = {}
+        for query in queries:
+            entries = plans[query._id]
+            if entries is None:
+                results[query._id] = frames[id(query)]
+                continue
+            if query._id in rejected:
+                results[query._id] = pd.DataFrame()
+                continue
+
+            partials = []
+            for package, key, final, stored in entries:
+                if stored is None:
+                    stored = frames[id(package)]
+                    if final and not package.stats().get("error"):
+                        self._partials.put("elastic", key, stored)
+                partials.append(stored)
+            results[query._id] = query.truncate_terms(merge_slices(query.merge_kind(), partials, query.total_key()))
+        return results
+
+    def _spans_multiple_windows(self, window: timedelta) -> bool:
+        if not self._date_range:
+            return False
+        start_date, end_date = self._date_range
+        return end_date - start_date > window
+
+    def run_msearch(self, queries: list['Package'], max_batch_size: int = 50) -> dict[str, pd.DataFrame]:
+        results = {}
+        pending = []
+        for query in queries:
+            cached = query.cached_result()
+            if cached is None:
+                pending.append(query)
+            else:
+                results[query._id] = cached
+
+        queries, requested = pending, queries
+        for start in range(0, len(queries), max_batch_size):
+            batch = queries[start:start + max_batch_size]
+            body = []
+            for query in batch:
+                body.extend(query.search_request())
+
+            self.logger.debug(f"Enviando {len(batch)} consultas en una sola petición _msearch")
+            responses = self._es.msearch(body=body, **self._msearch_params(batch)).get("responses", [])
+            if len(responses) != len(batch):
+                self.logger.error(f"_msearch devolvió {len(responses)} respuestas para {len(batch)} consultas")
+
+            for query, response in zip(batch, responses):
+                try:
+                    results[query._id] = query.run_from_response(response)
+                except Exception:
+                    results[query._id] = pd.DataFrame()
+
+        return {query._id: results.get(query._id, pd.DataFrame()) for query in requested}
+
+    def _msearch_params(self, batch: list['Package']) -> dict:
+        filter_paths = [query.filter_path() for query in batch]
+        if any(filter_path is None for filter_path in filter_paths):
+            return {}
+        paths = dict.fromkeys(["error", "status"] + [path for filter_path in filter_paths for path in filter_path])
+        return {"filter_path": ",".join(f"responses.{path}" for path in paths)}
 
     def load_queries(self, folder: str) -> list['Package']:
-        folder_path = os.path.realpath(folder)
-        self._validate_folder_path(folder_path)
-        json_files = glob.glob(os.path.join(folder_path, "**/*.json"), recursive=True)
+        registry = self.get_registry(folder)
         queries = []
         date_range = self._get_epoch_millis_range()
 
-        for file in json_files:
-            data = self._load_json_file(file)
-            if not self._is_valid_data(data):
-                self.logger.warn(f"Formato de datos no reconocido en el archivo {file}.")
-                continue
+        for template in registry.refresh():
             try:
-                data['query'] = self._replace_placeholders(data, date_range)
-                queries.append(Package(self, data))
+                queries.append(self._build_package(template, date_range))
             except KeyError as e:
-                self.logger.error(f"Error al procesar el archivo {file}: {e}")
+                self.logger.error(f"Error al procesar la consulta {template.data.get('id')}: {e}")
         
         return queries
 
-    def _replace_placeholders(self, data: dict, date_range: dict) -> dict:
-        query_str = json.dumps(data['query'])
-        
-        # Reemplazo del rango de fechas
-        date_replacement = data['processing_policy']['date_range_replacement']
-        query_str = query_str.replace(date_replacement['gte_placeholder'], str(date_range['gte']))
-        query_str = query_str.replace(date_replacement['lte_placeholder'], str(date_range['lte']))
-        
-        # Reemplazo de entity_ids
-        entity_replacement = data['processing_policy']['entity_ids_replacement']
-        entity_ids_list = [str(id) for id in self._entity_ids['EntityID']]
-        
-        if entity_replacement['type'] == "term":
-            terms_query = json.dumps({"terms": {entity_replacement['field']: entity_ids_list}})
-            query_str = query_str.replace(f'"{entity_replacement["placeholder"]}"', terms_query)
-        elif entity_replacement['type'] == "match":
-            entity_id_matches = [{'match': {entity_replacement['field']: str(id)}} for id in self._entity_ids['EntityID']]
-            entity_id_placeholder = f'[{{"match": {{"{entity_replacement["field"]}": "{entity_replacement["placeholder"]}"}}}}]'
-            query_str = query_str.replace(entity_id_placeholder, json.dumps(entity_id_matches))
-        elif entity_replacement['type'] == "query_string":
-            entity_ids_str = " OR ".join(entity_ids_list)
-            query_str = query_str.replace(entity_replacement['placeholder'], f'{entity_replacement["field"]}: ({entity_ids_str})')
-
-        return self._load_json_str(query_str)
-
-    def _load_json_str(self, json_str: str) -> dict:
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            self.logger.error("Error al decodificar JSON:", e)
-            self.logger.error("Query string con error:", json_str)
-            raise
-
-    def _validate_folder_path(self, folder_path: str):
-        if not os.path.exists(folder_path):
-            raise FileNotFoundError(f"La ruta {folder_path} no existe.")
-        if not os.path.isdir(folder_path):
-            raise NotADirectoryError(f"{folder_path} no es un directorio.")
-
-    def _load_json_file(self, file: str) -> dict:
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            self.logger.error(f"Error al procesar el archivo {file}: {e}")
-            return {}
+    def get_registry(self, folder: str) -> QueryRegistry:
+        folder_path = os.path.realpath(folder)
+        if folder_path not in self._registries:
+            self._registries[folder_path] = QueryRegistry(folder_path)
+        return self._registries[folder_path]
+
+    def _build_package(self, template: QueryTemplate, date_range: dict, complete_buckets: bool = False, draft: float | None = None) -> 'Package':
+        entity_ids = self._entity_id_list()
+        bound = {**template.data, 'query': template.bind(date_range, entity_ids, self._histogram_interval(template))}
+        if complete_buckets:
+            bound['result_processing'] = {**bound.get('result_processing', {}), 'complete_buckets': True}
+        return Package(self, bound, template=template, date_range=date_range, entity_ids=entity_ids, draft=draft)
+
+    def _histogram_interval(self, template: QueryTemplate) -> str | None:
+        """
+        Intervalo del histograma calculado sobre el rango completo del reporte,
+        de modo que las ventanas y los días parciales usen los mismos buckets.
+        """
+        date_range = self._get_epoch_millis_range()
+        if not template.has_interval or not date_range:
+            return None
+        return histogram_interval(date_range, self._histogram_buckets or template.target_buckets)
 
-    def _is_valid_data(self, data: dict) -> bool:
-        return 'query' in data and 'query' in data['query'] and 'processing_policy' in data
+    def _entity_id_list(self) -> list[str]:
+        return [str(id) for id in self._entity_ids['EntityID']]
 
     def _convert_to_epoch_millis(self, date_obj: datetime) -> int:
         return int(date_obj.timestamp() * 1000) if date_obj else None
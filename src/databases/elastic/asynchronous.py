@@ -0,0 +1,98 @@
+import asyncio
+import inspect
+import pandas as pd
+
+from . import Elastic
+from .package import Package
+from .telemetry import ResponseSizeSerializer
+
+try:
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    try:
+        from elasticsearch_async import AsyncElasticsearch
+    except (ImportError, AttributeError):
+        # elasticsearch-async usa ``asyncio.coroutine``, que no existe desde Python 3.11.
+        AsyncElasticsearch = None
+
+class AsyncElastic(Elastic):
+    """
+    Variante de Elastic que ejecuta los paquetes sobre un único event loop y un
+    único pool de conexiones asíncrono, limitando la concurrencia con un semáforo.
+
+    Usa ``AsyncElasticsearch`` (elasticsearch>=7.8 o elasticsearch-async para
+    6.x, ver requirements-async.txt). El cliente se crea dentro de su event
+    loop para que sus sesiones de aiohttp queden ligadas a él y recibe las
+    mismas opciones de transporte que el síncrono (compresión, tamaño del pool,
+    keep-alive y el serializador que mide las respuestas); elasticsearch-async
+    ignora el tamaño del pool y no comprime las peticiones. Si ninguno está
+    instalado, las consultas se ejecutan en hilos con el cliente síncrono.
+    """
+    def __init__(self, host: str = "http://localhost:9200", timeout: int = 30, max_retries: int = 10, retry_on_timeout: bool = True, max_concurrency: int = 20,
+                 http_compress: bool = False, pool_maxsize: int | None = None, keep_alive: bool = True, **kwargs) -> None:
+        super().__init__(host, timeout, max_retries, retry_on_timeout, http_compress=http_compress, pool_maxsize=pool_maxsize, keep_alive=keep_alive, **kwargs)
+        self._max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._aes = None
+
+        if AsyncElasticsearch is None:
+            self.logger.warning("No hay un cliente asíncrono de Elasticsearch instalado, se usarán hilos.")
+        else:
+            self._aes = self._loop.run_until_complete(self._create_client(
+                [host],
+                timeout=timeout,
+                max_retries=max_retries,
+                retry_on_timeout=retry_on_timeout,
+                serializer=ResponseSizeSerializer(),
+                http_compress=http_compress,
+                # Una conexión por consulta concurrente como mínimo
+                maxsize=pool_maxsize or max(10, max_concurrency),
+                headers=None if keep_alive else {"connection": "close"}
+            ))
+
+    @staticmethod
+    async def _create_client(*args, **options) -> 'AsyncElasticsearch':
+        # Dentro del loop, ``asyncio.get_event_loop()`` devuelve ``self._loop`` en ambos clientes.
+        return AsyncElasticsearch(*args, **options)
+
+    def _run_queries(self, queries: list['Package'], max_workers: int | None = None, batch_msearch: bool | None = None) -> dict[str, pd.DataFrame]:
+        batch_msearch = self._batch_msearch if batch_msearch is None else batch_msearch
+        incremental = self._partials is not None and self._date_range
+        sliced = self._slice_window and self._spans_multiple_windows(self._slice_window)
+        if batch_msearch or incremental or sliced:
+            # Los modos incremental, por ventanas y msearch los resuelve Elastic.
+            return super()._run_queries(queries, max_workers, batch_msearch)
+        return self._loop.run_until_complete(self.run_queries_async(queries, max_workers))
+
+    async def run_queries_async(self, queries: list['Package'], max_concurrency: int | None = None) -> dict[str, pd.DataFrame]:
+        frames = await self.gather(queries, max_concurrency)
+        return {query._id: df for query, df in zip(queries, frames)}
+
+    async def gather(self, queries: list['Package'], max_concurrency: int | None = None) -> list[pd.DataFrame]:
+        """
+        Ejecuta todos los paquetes con asyncio.gather y devuelve sus resultados
+        en el mismo orden. Un paquete que falla devuelve un DataFrame vacío.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self._max_concurrency)
+
+        async def run(query: 'Package') -> pd.DataFrame:
+            async with semaphore:
+                try:
+                    return await query.run_async()
+                except Exception as e:
+                    self.logger.error(f"Error al ejecutar el paquete {query._id}: {e}")
+                    return pd.DataFrame()
+
+        return list(await asyncio.gather(*(run(query) for query in queries)))
+
+    async def close_async(self) -> None:
+        if self._aes is None:
+            return
+        closing = self._aes.close() if hasattr(self._aes, "close") else self._aes.transport.close()
+        if inspect.isawaitable(closing):
+            await closing
+
+    def close(self) -> None:
+        self._loop.run_until_complete(self.close_async())
+        self._loop.close()
+        super().close()
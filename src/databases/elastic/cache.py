@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import pandas as pd
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from src.utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from .package import Package
+
+class ResultCache:
+    """
+    Caché en disco (Parquet) de los resultados de Package.run().
+
+    La clave combina el id del paquete, un hash del cuerpo que se envía (ya
+    sustituido y proyectado) y de la parte de ``result_processing`` que cambia
+    el resultado, los Entity IDs y el rango en epoch_millis. Los rangos que terminaron hace
+    más de ``immutable_after`` nunca expiran; el resto vive ``ttl``. Cuando el
+    tamaño total supera ``max_bytes`` se eliminan las entradas menos usadas.
+    """
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: str = "./output/cache/elastic", max_bytes: int = 512 * 1024 * 1024,
+                 ttl: timedelta = timedelta(hours=1), immutable_after: timedelta = timedelta(days=2)) -> None:
+        self._directory = os.path.realpath(directory)
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._immutable_after = immutable_after
+        self._lock = threading.Lock()
+        self.logger = get_logger()
+
+        os.makedirs(self._directory, exist_ok=True)
+        self._index = self._load_index()
+
+    def make_key(self, package: 'Package') -> str:
+        # Las visualizaciones no cambian el DataFrame; el resto de result_processing
+        # (columns, complete_buckets, include_totals...) sí.
+        result_processing = {key: value for key, value in package._result_processing.items() if key != "visualizations"}
+        payload = {
+            "id": package._id,
+            "query": self._hash({"body": package._body, "result_processing": result_processing}),
+            "entity_ids": [str(entity_id) for entity_id in package._entity_ids],
+            "date_range": [package._date_range.get("gte"), package._date_range.get("lte")],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _hash(value) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def contains(self, package: 'Package') -> bool:
+        """Indica si hay un resultado vigente para el paquete, sin leerlo."""
+        key = self.make_key(package)
+        with self._lock:
+            entry = self._index.get(key)
+            return entry is not None and (entry["expires_at"] is None or entry["expires_at"] >= time.time())
+
+    def get(self, package: 'Package') -> pd.DataFrame | None:
+        key = self.make_key(package)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] is not None and entry["expires_at"] < time.time():
+                self._remove(key)
+                self._save_index()
+                return None
+
+            try:
+                df = pd.read_parquet(self._path(key))
+            except Exception as e:
+                self.logger.warning(f"No se pudo leer la caché de {package._id}: {e}")
+                self._remove(key)
+                self._save_index()
+                return None
+
+            entry["last_access"] = time.time()
+            self._save_index()
+
+        self.logger.debug(f"Resultado de {package._id} leído desde la caché")
+        return df
+
+    def put(self, package: 'Package', df: pd.DataFrame) -> None:
+        key = self.make_key(package)
+        path = self._path(key)
+        try:
+            df.to_parquet(path, index=False, compression="zstd")
+        except Exception as e:
+            self.logger.debug(f"El resultado de {package._id} no se puede guardar en la caché: {e}")
+            return
+
+        now = time.time()
+        range_end = package._date_range.get("lte")
+        immutable = range_end is not None and range_end / 1000 < now - self._immutable_after.total_seconds()
+
+        with self._lock:
+            self._index[key] = {
+                "id": package._id,
+                "size": os.path.getsize(path),
+                "last_access": now,
+                "expires_at": None if immutable else now + self._ttl.total_seconds(),
+            }
+            self._evict()
+            self._save_index()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
+
+    def _evict(self) -> None:
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total <= self._max_bytes:
+                break
+            total -= self._index[key]["size"]
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.parquet")
+
+    def _load_index(self) -> dict:
+        path = os.path.join(self._directory, self.INDEX_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return {}
+        return {key: entry for key, entry in index.items() if os.path.exists(self._path(key))}
+
+    def _save_index(self) -> None:
+        path = os.path.join(self._directory, self.INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, path)
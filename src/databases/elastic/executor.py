@@ -0,0 +1,48 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING
+
+from src.utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from .package import Package
+
+class PackageExecutor:
+    """
+    Ejecuta un conjunto de paquetes de Elastic de forma concurrente usando
+    un pool de hilos con un límite de paralelismo configurable.
+    """
+    def __init__(self, max_workers: int = 4) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers debe ser mayor o igual a 1")
+        self._max_workers = max_workers
+        self.logger = get_logger()
+
+    def run(self, packages: list['Package']) -> dict[str, pd.DataFrame]:
+        """
+        Ejecuta todos los paquetes y devuelve los resultados indexados por el id
+        de cada paquete, en el mismo orden en que fueron recibidos.
+        """
+        return {package._id: df for package, df in zip(packages, self.map(packages))}
+
+    def map(self, packages: list['Package']) -> list[pd.DataFrame]:
+        """
+        Ejecuta todos los paquetes y devuelve sus resultados en el mismo orden.
+        Un paquete que falla devuelve un DataFrame vacío sin detener al resto.
+        """
+        if not packages:
+            return []
+
+        results = [pd.DataFrame() for _ in packages]
+        workers = min(self._max_workers, len(packages))
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="elastic") as pool:
+            futures = {pool.submit(package.run): position for position, package in enumerate(packages)}
+            for future in as_completed(futures):
+                position = futures[future]
+                try:
+                    results[position] = future.result()
+                except Exception as e:
+                    self.logger.error(f"Error al ejecutar el paquete {packages[position]._id}: {e}")
+
+        return results
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from itertools import repeat
+
+
+def flatten_buckets(aggregations: dict, path: tuple = (), fields: dict[str, tuple[int, str]] | None = None) -> pd.DataFrame:
+    """
+    Aplana agregaciones de buckets anidadas, de cualquier profundidad, en un
+    solo recorrido llenando listas por columna. El DataFrame se construye una
+    única vez al final.
+
+    :param aggregations: Sección "aggregations" de la respuesta.
+    :param path: Nombre de la sub-agregación a seguir en cada nivel. ``None``
+        usa la primera sub-agregación que tenga buckets.
+    :param fields: Columna de salida -> (nivel, campo del bucket). Si se omite,
+        se vuelcan todos los campos de los buckets del último nivel.
+    :return: Una fila por bucket del último nivel.
+    """
+    depth = len(path)
+    columns: dict[str, list] = {name: [] for name in fields} if fields else {}
+    chain: list[dict] = []
+    rows = 0
+
+    def emit(buckets: list) -> None:
+        nonlocal rows
+        if fields:
+            # Los campos de los niveles superiores se repiten para todo el bloque.
+            for name, (level, field) in fields.items():
+                if level == depth:
+                    columns[name].extend([bucket.get(field, np.nan) for bucket in buckets])
+                else:
+                    columns[name].extend(repeat(chain[level].get(field, np.nan), len(buckets)))
+            rows += len(buckets)
+            return
+
+        for bucket in buckets:
+            for key, value in bucket.items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = [np.nan] * rows
+                column.append(value)
+            rows += 1
+            for column in columns.values():
+                if len(column) < rows:
+                    column.append(np.nan)
+
+    def walk(buckets: list, level: int) -> None:
+        if level == depth:
+            emit(buckets)
+            return
+        for bucket in buckets:
+            children = _child_buckets(bucket, path[level])
+            if children:
+                chain.append(bucket)
+                walk(children, level + 1)
+                chain.pop()
+
+    for agg in aggregations.values():
+        if isinstance(agg, dict) and 'buckets' in agg:
+            walk(_as_list(agg['buckets']), 0)
+
+    return pd.DataFrame(columns)
+
+
+def _child_buckets(bucket: dict, name: str | None) -> list | None:
+    if name is not None:
+        child = bucket.get(name)
+        return _as_list(child['buckets']) if isinstance(child, dict) and 'buckets' in child else None
+    for value in bucket.values():
+        if isinstance(value, dict) and 'buckets' in value:
+            return _as_list(value['buckets'])
+    return None
+
+
+def _as_list(buckets: list | dict) -> list:
+    # Las agregaciones "filters" con nombre devuelven los buckets como un diccionario.
+    if isinstance(buckets, dict):
+        return [{**bucket, "key": key} for key, bucket in buckets.items()]
+    return buckets
@@ -0,0 +1,107 @@
+import ast
+import numpy as np
+import pandas as pd
+from typing import Any
+
+# Prefijos con los que puede empezar un literal de Python. Cualquier otra cadena
+# haría fallar a ast.literal_eval, así que no vale la pena intentarlo.
+_LITERAL_PATTERN = r"^[ \t]*(?:[-+\d.\[{(]|[bBrRuU]{0,2}['\"]|True|False|None)"
+# Direcciones IP y fechas ISO empiezan por un dígito pero nunca son literales.
+_NON_LITERAL_PATTERN = r"^[ \t]*(?:\d+(?:\.\d+){2,}|\d{4}-\d{2}-\d{2}[T ])"
+
+# Tipos inferidos por pandas que no contienen listas, diccionarios ni cadenas.
+_SCALAR_KINDS = {"empty", "integer", "floating", "mixed-integer-float", "decimal", "complex",
+                 "boolean", "datetime64", "datetime", "date", "timedelta64", "timedelta",
+                 "time", "period", "interval", "bytes"}
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza los valores de una respuesta de Elastic columna por columna:
+    desenvuelve listas de un elemento, deserializa literales de Python y
+    extrae el campo "value" de los diccionarios que lo contienen.
+    """
+    # Se arma por posición: un nombre generado puede coincidir con otra columna
+    # (``a``, ``a``, ``a_1``) y un diccionario por nombre perdería una de ellas.
+    result = pd.DataFrame({position: normalize_column(df.iloc[:, position]) for position in range(df.shape[1])}, index=df.index)
+    result.columns = rename_duplicate_columns(df.columns)
+    return result
+
+
+def normalize_column(col: pd.Series) -> pd.Series:
+    if col.dtype != object and not pd.api.types.is_string_dtype(col.dtype):
+        return col
+
+    values = col.to_numpy(dtype=object, copy=True)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+
+    if kind in _SCALAR_KINDS:
+        return col.infer_objects()
+
+    if kind == "string":
+        changed = _deserialize_literals(values, ~pd.isna(values))
+    else:
+        types = np.fromiter(map(type, values), dtype=object, count=len(values))
+        changed = _unwrap_single_lists(values, types)
+        changed |= _deserialize_literals(values, types == str)
+        changed |= _unwrap_value_dicts(values, types == dict)
+
+    if not changed:
+        return col.infer_objects()
+    return pd.Series(values, index=col.index, name=col.name).infer_objects()
+
+
+def rename_duplicate_columns(columns: pd.Index) -> pd.Index:
+    seen = {}
+    new_columns = []
+    for col in columns:
+        if col in seen:
+            seen[col] += 1
+            new_columns.append(f"{col}_{seen[col]}")
+        else:
+            seen[col] = 0
+            new_columns.append(col)
+    return pd.Index(new_columns)
+
+
+def _unwrap_single_lists(values: np.ndarray, types: np.ndarray) -> bool:
+    positions = [i for i in np.flatnonzero(types == list) if len(values[i]) == 1]
+    for i in positions:
+        values[i] = values[i][0]
+        types[i] = type(values[i])
+    return bool(positions)
+
+
+def _deserialize_literals(values: np.ndarray, strings: np.ndarray) -> bool:
+    if not strings.any():
+        return False
+
+    texts = pd.Series(values[strings], dtype=object).str
+    candidates = (texts.match(_LITERAL_PATTERN) & ~texts.match(_NON_LITERAL_PATTERN)).to_numpy(dtype=bool)
+    positions = np.flatnonzero(strings)[candidates]
+    if positions.size == 0:
+        return False
+
+    # Cada texto distinto se evalúa una sola vez.
+    parsed = {text: _unwrap_value(_literal_eval(text)) for text in pd.unique(values[positions])}
+    for i in positions:
+        values[i] = parsed[values[i]]
+    return True
+
+
+def _unwrap_value_dicts(values: np.ndarray, dicts: np.ndarray) -> bool:
+    positions = [i for i in np.flatnonzero(dicts) if 'value' in values[i]]
+    for i in positions:
+        values[i] = values[i]['value']
+    return bool(positions)
+
+
+def _unwrap_value(x: Any) -> Any:
+    return x['value'] if isinstance(x, dict) and 'value' in x else x
+
+
+def _literal_eval(text: str) -> Any:
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError):
+        return text
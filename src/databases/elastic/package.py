@@ -1,19 +1,33 @@
-import ast
 import json
+import time
+import asyncio
 import pandas as pd
 from src.utils.logger import get_logger
-from typing import TYPE_CHECKING, Union, Dict, Any
+from .normalize import normalize_frame
+from .flatten import flatten_buckets
+from .telemetry import response_stats, reset_response_size, last_response_size, last_wire_size
+from typing import TYPE_CHECKING, Union, Dict, Any, Iterator
 
 if TYPE_CHECKING:
     from . import Elastic
+    from .template import QueryTemplate
 
 class Package:
-    def __init__(self, elastic: 'Elastic', data: dict) -> None:
-        self._initialize_attributes(elastic, data)
+    def __init__(self, elastic: 'Elastic', data: dict, template: 'QueryTemplate | None' = None, date_range: dict | None = None, entity_ids: list | None = None, draft: float | None = None) -> None:
         self.logger = get_logger()
+        self._initialize_attributes(elastic, data, draft)
+        self._template = template
+        self._date_range = date_range or {}
+        self._entity_ids = entity_ids or []
+        self._result_kind = None
+        self._stats: dict = {}
+        self._preflight: dict | None = None
 
-    def _initialize_attributes(self, elastic, data):
+    def _initialize_attributes(self, elastic, data, draft=None):
         self._es = elastic._es
+        self._aes = getattr(elastic, "_aes", None)
+        self._cache = elastic._cache
+        self._telemetry = getattr(elastic, "telemetry", None)
         self._id = data.get("id")
         self._metadata = data.get("metadata", {})
         self._name = self._metadata.get("name")
@@ -21,29 +35,286 @@ class Package:
         self._processing_policy = data.get("processing_policy", {})
         self._mode = self._processing_policy.get("mode")
         self._index = self._processing_policy.get("index")
-        self._query = data.get("query")
+        self._draft = draft if draft is not None else getattr(elastic, "_draft", None)
+        self._query = self._draft_query(data.get("query"))
         self._result_processing = data.get("result_processing", {})
         self._include_totals = self._result_processing.get("include_totals", False)
         self._columns = self._result_processing.get("columns", [])
+        self._complete_buckets = self._result_processing.get("complete_buckets", False)
+        self._composite_page_size = self._result_processing.get("composite_page_size", 1000)
+        self._composite_paging = self._check_composite_paging()
+        self._body, self._filter_path = self._build_projection()
 
     def run(self) -> pd.DataFrame:
+        started = self._begin_stats()
         try:
             self._validate_query_parameters()
+            cached = self.cached_result()
+            if cached is not None:
+                return cached
+
             index_str = self._format_index()
-            response = self._execute_query(index_str)
+            if self._uses_composite_paging():
+                df = self._timed("normalize_time", self._normalize_array_values, self._run_composite(index_str))
+                df = self._flag_draft(df)
+            else:
+                response = self._execute_query(index_str)
+                df = self._build_dataframe(response)
 
-            if not response:
-                raise ValueError("No data found in the response.")
+            return self._store_result(df)
 
-            df = self._process_response(response)
-            df = self._normalize_array_values(df)
+        except Exception as e:
+            self._stats["error"] = str(e)
+            self.logger.error(f"An error has occurred: {e}")
+            raise
+        finally:
+            self._finish_stats(started)
 
-            return df
+    async def run_async(self) -> pd.DataFrame:
+        if self._aes is None or self._uses_composite_paging():
+            return await asyncio.to_thread(self.run)
+
+        started = self._begin_stats()
+        try:
+            self._validate_query_parameters()
+            cached = self.cached_result()
+            if cached is not None:
+                return cached
+
+            query_func = self._aes.msearch if self._mode == "multi" else self._aes.search
+            reset_response_size()
+            response = await query_func(index=self._format_index(), **self._search_params())
+            self._collect_response_stats(response, last_response_size(), last_wire_size())
+            df = await asyncio.to_thread(self._build_dataframe, response)
+
+            return self._store_result(df)
+
+        except Exception as e:
+            self._stats["error"] = str(e)
+            self.logger.error(f"An error has occurred: {e}")
+            raise
+        finally:
+            self._finish_stats(started)
+
+    def run_from_response(self, response: dict) -> pd.DataFrame:
+        started = self._begin_stats()
+        self._stats["batched"] = True
+        try:
+            if "error" in response:
+                raise ValueError(f"The search failed: {response['error']}")
+            self._collect_response_stats(response, None)
+            return self._store_result(self._build_dataframe(response))
+
+        except Exception as e:
+            self._stats["error"] = str(e)
+            self.logger.error(f"An error has occurred: {e}")
+            raise
+        finally:
+            self._finish_stats(started)
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+    def is_cached(self) -> bool:
+        return self._cache is not None and self._cache.contains(self)
+
+    def cached_result(self) -> pd.DataFrame | None:
+        df = self._cache.get(self) if self._cache else None
+        if df is not None:
+            self._stats.update(cached=True, rows=len(df))
+        return df
+
+    def _store_result(self, df: pd.DataFrame) -> pd.DataFrame:
+        self._stats["rows"] = len(df)
+        if self._cache:
+            self._cache.put(self, df)
+        return df
+
+    def _begin_stats(self) -> float:
+        self._stats = {"requests": 0, "process_time": 0.0, "normalize_time": 0.0}
+        return time.perf_counter()
+
+    def _finish_stats(self, started: float) -> None:
+        self._stats["wall_time"] = time.perf_counter() - started
+        if self._telemetry is not None:
+            self._telemetry.record({
+                "id": self._id,
+                "name": self._name,
+                "date_range": [self._date_range.get("gte"), self._date_range.get("lte")],
+                **self._stats,
+                **({"preflight": self._preflight} if self._preflight else {}),
+            })
+
+    def _collect_response_stats(self, response: dict, response_bytes: int | None, wire_bytes: int | None = None) -> None:
+        stats = response_stats(response)
+        stats["response_bytes"] = response_bytes
+        stats["wire_bytes"] = wire_bytes
+        self._stats["requests"] += 1
+
+        # Las consultas paginadas suman las métricas de cada página.
+        for key, value in stats.items():
+            previous = self._stats.get(key)
+            if isinstance(value, list):
+                self._stats[key] = (previous or []) + value
+            elif isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(previous, (int, float)):
+                self._stats[key] = previous + value
+            else:
+                self._stats[key] = value if previous is None or value is not None else previous
+
+    def _timed(self, key: str, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._stats[key] = self._stats.get(key, 0.0) + time.perf_counter() - started
+
+    def is_sampleable(self) -> bool:
+        """
+        Indica si el paquete admite el modo borrador: una consulta simple con
+        agregaciones.
+        """
+        query = self._query
+        return self._mode == "single" and isinstance(query, dict) and bool(query.get("aggs", query.get("aggregations")))
+
+    def is_streamable(self) -> bool:
+        query = self._query or {}
+        return not any(key in query for key in ("aggs", "aggregations")) and query.get("size", 10) > 0 and not self._include_totals
+
+    def stream(self, page_size: int = 1000, keep_alive: str = "1m") -> Iterator[pd.DataFrame]:
+        try:
+            self._validate_query_parameters()
+            index_str = self._format_index()
+            pages = self._iter_pit_pages if hasattr(self._es, "open_point_in_time") else self._iter_scroll_pages
+            fields = self._declared_fields()
+            for hits in pages(index_str, page_size, keep_alive):
+                df = pd.DataFrame(self._extract_hits(hits))
+                if fields:
+                    # Con columnas declaradas todas las páginas tienen el mismo esquema,
+                    # aunque un campo no aparezca en los documentos de la primera.
+                    df = df.reindex(columns=fields)
+                yield self._normalize_array_values(df)
 
         except Exception as e:
             self.logger.error(f"An error has occurred: {e}")
             raise
 
+    def is_sliceable(self) -> bool:
+        return self._mode == "single" and self._template is not None
+
+    def is_mergeable(self) -> bool:
+        """
+        Indica si los resultados de varios rangos se pueden combinar de forma
+        exacta: conteos, histogramas y una agregación terms completa.
+        """
+        if not self.is_sliceable() or not isinstance(self._query, dict):
+            return False
+        aggs = self._query.get("aggs", self._query.get("aggregations"))
+        if not aggs:
+            return self._query.get("size") == 0 and self.total_key() is not None
+        return self._mergeable_aggs(aggs, allow_terms=len(aggs) == 1)
+
+    def merge_kind(self) -> str:
+        aggs = self._query.get("aggs", self._query.get("aggregations"))
+        if not aggs:
+            return "hits"
+        agg = next(iter(aggs.values()))
+        sub_aggs = agg.get("aggs", agg.get("aggregations")) or {}
+        return "type_3" if "terms" in agg and "date_histogram" in sub_aggs else "type_2"
+
+    def truncate_terms(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Recorta un resultado combinado al ``size`` y al orden de la agregación
+        terms de la consulta.
+        """
+        terms_aggregation = self._terms_aggregation()
+        if terms_aggregation is None or df.empty or "key" not in df.columns:
+            return df
+
+        terms = terms_aggregation[2]["terms"]
+        size = terms.get("size", 10)
+        if "key_as_string" in df.columns:
+            keys = df["key"].drop_duplicates().head(size)
+            return df[df["key"].isin(keys)].reset_index(drop=True)
+        df = self._sort_like_terms(df, terms.get("order", {"_count": "desc"}))
+        return df.head(size).reset_index(drop=True)
+
+    def _mergeable_aggs(self, aggs: dict, allow_terms: bool) -> bool:
+        for agg in aggs.values():
+            kinds = [key for key in agg if key not in ("aggs", "aggregations", "meta")]
+            if len(kinds) != 1 or not (kinds[0] in ("date_histogram", "histogram") or kinds[0] == "terms" and allow_terms):
+                return False
+            # Los filtros de términos no se pueden paginar con composite y
+            # min_doc_count solo vale sobre el total, no por rango.
+            if kinds[0] == "terms" and (self._has_term_filters(agg["terms"]) or agg["terms"].get("min_doc_count", 1) > 1):
+                return False
+            sub_aggs = agg.get("aggs", agg.get("aggregations"))
+            if sub_aggs and not self._mergeable_aggs(sub_aggs, allow_terms=False):
+                return False
+        return True
+
+    def total_key(self) -> str | None:
+        if not self._include_totals:
+            return None
+        return next((col.get('_include_totals') for col in self._columns if isinstance(col, dict) and '_include_totals' in col), None)
+
+    def is_batchable(self) -> bool:
+        return self._mode == "single" and all([self._id, self._index, self._query]) and not self._uses_composite_paging()
+
+    def search_request(self) -> tuple[dict, dict]:
+        self._validate_query_parameters()
+        return {"index": self._format_index()}, self._body
+
+    def filter_path(self) -> list[str] | None:
+        return self._filter_path
+
+    def _build_dataframe(self, response: dict) -> pd.DataFrame:
+        if not response:
+            raise ValueError("No data found in the response.")
+
+        df = self._timed("process_time", self._process_response, response)
+        df = self._timed("normalize_time", self._normalize_array_values, df)
+
+        return self._flag_draft(df)
+
+    def _draft_query(self, query):
+        """
+        En modo borrador las consultas con agregaciones se limitan a una muestra
+        aleatoria de los documentos: cada documento recibe una puntuación
+        aleatoria uniforme en [0, 1) y ``min_score`` descarta los que quedan
+        por debajo de ``1 - probabilidad``. Es el equivalente en 6.x de la
+        agregación ``random_sampler``.
+        """
+        if not self._draft or self._mode != "single" or not isinstance(query, dict):
+            return query
+        if not query.get("aggs", query.get("aggregations")):
+            return query
+
+        random_score = {"function_score": {
+            "query": query.get("query", {"match_all": {}}),
+            "functions": [{"random_score": {"seed": 42, "field": "_seq_no"}}],
+            "boost_mode": "replace",
+        }}
+        return {**query, "query": random_score, "min_score": 1 - self._draft}
+
+    def _is_draft(self) -> bool:
+        return isinstance(self._query, dict) and "min_score" in self._query and self._draft is not None
+
+    def _flag_draft(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self._is_draft():
+            df.attrs["approximate"] = True
+            df.attrs["sample_probability"] = self._draft
+        return df
+
+    def _scale_counts(self, node):
+        if isinstance(node, dict):
+            return {
+                key: round(value / self._draft) if key in ("doc_count", "sum_other_doc_count") and isinstance(value, (int, float)) else self._scale_counts(value)
+                for key, value in node.items()
+            }
+        if isinstance(node, list):
+            return [self._scale_counts(value) for value in node]
+        return node
+
     def _validate_query_parameters(self):
         if not all([self._id, self._index, self._query]):
             raise ValueError("ID, index, and query must be provided.")
@@ -53,7 +324,151 @@ class Package:
 
     def _execute_query(self, index_str: str) -> Dict[str, Any]:
         query_func = self._es.msearch if self._mode == "multi" else self._es.search
-        return query_func(index=index_str, body=self._query, _source=True)
+        reset_response_size()
+        response = query_func(index=index_str, **self._search_params())
+        self._collect_response_stats(response, last_response_size(), last_wire_size())
+        return response
+
+    def _search_params(self) -> dict:
+        if self._filter_path is None:
+            return {"body": self._body, "_source": True}
+        return {"body": self._body, "filter_path": ",".join(self._filter_path)}
+
+    def _build_projection(self) -> tuple[Any, list[str] | None]:
+        query = self._query
+        if not isinstance(query, dict) or self._mode == "multi" or not self._result_processing.get("projection", True):
+            return query, None
+
+        envelope = ["took", "timed_out", "_shards", "hits.total"]
+        aggs = query.get("aggs", query.get("aggregations"))
+        if aggs:
+            # Con agregaciones los hits nunca se procesan, así que no se piden.
+            return {**query, "size": 0}, envelope + [f"aggregations.{name}" for name in aggs]
+
+        fields = self._declared_fields()
+        filter_path = envelope + ["hits.hits._source", "hits.hits.fields", "hits.hits.sort"]
+        if fields and query.get("_source", True) in (True, {"excludes": []}):
+            return {**query, "_source": {"includes": fields}}, filter_path
+        return query, filter_path
+
+    def _declared_fields(self) -> list[str]:
+        return [col for col in self._columns if isinstance(col, str)]
+
+    def _terms_aggregation(self) -> tuple[str, str, dict] | None:
+        query = self._query or {}
+        aggs_key = "aggs" if "aggs" in query else "aggregations"
+        aggs = query.get(aggs_key, {})
+        if len(aggs) != 1:
+            return None
+        name, agg = next(iter(aggs.items()))
+        return (aggs_key, name, agg) if "terms" in agg else None
+
+    def _uses_composite_paging(self) -> bool:
+        return self._composite_paging
+
+    def _check_composite_paging(self) -> bool:
+        if not self._complete_buckets:
+            return False
+        terms_aggregation = self._terms_aggregation()
+        if terms_aggregation is None:
+            self.logger.warning(f"complete_buckets requires a single top-level terms aggregation in {self._id}, ignoring it.")
+            return False
+        if self._has_term_filters(terms_aggregation[2]["terms"]):
+            self.logger.warning(f"complete_buckets does not support include/exclude in {self._id}, running the plain terms aggregation.")
+            return False
+        return True
+
+    @staticmethod
+    def _has_term_filters(terms: dict) -> bool:
+        return "include" in terms or "exclude" in terms
+
+    def _run_composite(self, index_str: str) -> pd.DataFrame:
+        aggs_key, name, agg = self._terms_aggregation()
+        terms = agg["terms"]
+        source = {key: terms[key] for key in ("field", "script", "missing_bucket") if key in terms}
+        # ``missing`` se emula con el bucket de valores nulos y ``min_doc_count``
+        # se aplica al recorrer las páginas.
+        missing = terms.get("missing")
+        if missing is not None:
+            source["missing_bucket"] = True
+        min_doc_count = terms.get("min_doc_count", 1)
+        composite = {"size": self._composite_page_size, "sources": [{name: {"terms": source}}]}
+        composite_agg = {"composite": composite}
+        if "aggs" in agg or "aggregations" in agg:
+            composite_agg["aggs"] = agg.get("aggs", agg.get("aggregations"))
+
+        body = {**self._query, aggs_key: {name: composite_agg}, "size": 0}
+        params = {"filter_path": ",".join(self._filter_path)} if self._filter_path else {}
+        frames = []
+        while True:
+            reset_response_size()
+            response = self._es.search(index=index_str, body=body, **params)
+            self._collect_response_stats(response, last_response_size(), last_wire_size())
+            page = response.get("aggregations", {}).get(name, {})
+            buckets = [
+                {**bucket, "key": missing if bucket["key"][name] is None and missing is not None else bucket["key"][name]}
+                for bucket in page.get("buckets", [])
+            ]
+            if not buckets:
+                break
+
+            buckets = [bucket for bucket in buckets if bucket["doc_count"] >= min_doc_count]
+            if buckets:
+                frames.append(self._timed("process_time", self._process_aggregations, {name: {"buckets": buckets}}))
+            if not page.get("after_key"):
+                break
+            composite["after"] = page["after_key"]
+
+        if not frames:
+            return pd.DataFrame()
+
+        df = pd.concat(frames, ignore_index=True)
+        return self._sort_like_terms(df, terms.get("order", {"_count": "desc"}))
+
+    def _sort_like_terms(self, df: pd.DataFrame, order: dict | list) -> pd.DataFrame:
+        order = order[0] if isinstance(order, list) and order else order
+        if not isinstance(order, dict) or not order:
+            return df
+
+        field, direction = next(iter(order.items()))
+        column = {"_count": "doc_count", "_key": "key", "_term": "key"}.get(field)
+        if column not in df.columns:
+            return df
+        return df.sort_values(column, ascending=direction == "asc", kind="stable", ignore_index=True)
+
+    def _stream_body(self, page_size: int) -> dict:
+        body = {key: value for key, value in self._body.items() if key not in ("aggs", "aggregations", "from")}
+        body["size"] = page_size
+        body.setdefault("sort", ["_doc"])
+        return body
+
+    def _iter_pit_pages(self, index_str: str, page_size: int, keep_alive: str) -> Iterator[list]:
+        pit_id = self._es.open_point_in_time(index=index_str, keep_alive=keep_alive)["id"]
+        body = self._stream_body(page_size)
+        try:
+            while True:
+                body["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                response = self._es.search(body=body)
+                hits = response["hits"]["hits"]
+                if not hits:
+                    break
+                yield hits
+                pit_id = response.get("pit_id", pit_id)
+                body["search_after"] = hits[-1]["sort"]
+        finally:
+            self._es.close_point_in_time(body={"id": pit_id})
+
+    def _iter_scroll_pages(self, index_str: str, page_size: int, keep_alive: str) -> Iterator[list]:
+        response = self._es.search(index=index_str, body=self._stream_body(page_size), scroll=keep_alive)
+        scroll_id = response.get("_scroll_id")
+        try:
+            while response["hits"]["hits"]:
+                yield response["hits"]["hits"]
+                response = self._es.scroll(scroll_id=scroll_id, scroll=keep_alive)
+                scroll_id = response.get("_scroll_id", scroll_id)
+        finally:
+            if scroll_id:
+                self._es.clear_scroll(scroll_id=scroll_id)
 
     def _process_response(self, response: dict) -> pd.DataFrame:
         if "aggregations" in response:
@@ -63,10 +478,16 @@ class Package:
         raise ValueError("Unknown response format.")
 
     def _process_aggregations(self, aggregations: dict) -> pd.DataFrame:
+        if self._is_draft():
+            # Los conteos de la muestra se escalan al total estimado.
+            aggregations = self._scale_counts(aggregations)
         if self._is_type_1_aggregation(aggregations):
+            self._result_kind = "type_1"
             return self._handle_type_1_aggregations(aggregations)
         if self._is_type_3_aggregation(aggregations):
+            self._result_kind = "type_3"
             return self._handle_type_3_aggregations(aggregations)
+        self._result_kind = "type_2"
         return self._handle_type_2_aggregations(aggregations)
 
     def _is_type_1_aggregation(self, aggregations: dict) -> bool:
@@ -98,35 +519,18 @@ class Package:
         return self._create_dataframe(all_hits, aggregations)
 
     def _handle_type_2_aggregations(self, aggregations: dict) -> pd.DataFrame:
-        all_hits = [
-            bucket
-            for agg in aggregations.values() if 'buckets' in agg
-            for bucket in agg['buckets']
-        ]
-        return self._create_dataframe(all_hits, aggregations)
+        return self._create_dataframe(flatten_buckets(aggregations), aggregations)
 
     def _handle_type_3_aggregations(self, aggregations: dict) -> pd.DataFrame:
-        df = self._handle_type_2_aggregations(aggregations)
-        if df.empty:
-            return pd.DataFrame()
-
-        expanded_histograms = [
-            self._expand_histogram(row)
-            for _, row in df.iterrows()
-            if 'date_histogram' in row and row['date_histogram']
-        ]
-
-        combined_df = pd.concat(expanded_histograms, ignore_index=True)
-        return combined_df[['key_as_string', 'key', 'doc_count']]
-
-    def _expand_histogram(self, row: pd.Series) -> pd.DataFrame:
-        hist_df = pd.DataFrame(row['date_histogram']['buckets'])
-        hist_df['key'] = row['key']
-        hist_df['doc_count'] = row['doc_count']
-        return hist_df
+        return flatten_buckets(aggregations, path=("date_histogram",), fields={
+            "key_as_string": (1, "key_as_string"),
+            "key": (0, "key"),
+            "doc_count": (0, "doc_count"),
+        })
 
     def _handle_hits(self, hits: dict) -> pd.DataFrame:
-        if not hits["hits"]:
+        self._result_kind = "hits"
+        if not hits.get("hits"):
             df = pd.DataFrame()
         else:
             all_fields = [
@@ -148,8 +552,8 @@ class Package:
     def _extract_hits(self, hits: list) -> list:
         return [{**hit.get('_source', {}), **hit.get('fields', {})} for hit in hits]
 
-    def _create_dataframe(self, all_hits: list, source: dict) -> pd.DataFrame:
-        df = pd.DataFrame(all_hits)
+    def _create_dataframe(self, all_hits: list | pd.DataFrame, source: dict) -> pd.DataFrame:
+        df = all_hits if isinstance(all_hits, pd.DataFrame) else pd.DataFrame(all_hits)
         if self._include_totals:
             df = self._add_totals(df, source)
         return df
@@ -163,27 +567,4 @@ class Package:
         return df
 
     def _normalize_array_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.apply(lambda col: col.map(lambda x: x[0] if isinstance(x, list) and len(x) == 1 else x))
-        df.columns = self._rename_duplicate_columns(df.columns)
-        df = df.apply(lambda col: col.map(self._deserialize))
-        return df.apply(lambda col: col.map(lambda x: x['value'] if isinstance(x, dict) and 'value' in x else x))
-
-    def _rename_duplicate_columns(self, columns: pd.Index) -> pd.Index:
-        seen = {}
-        new_columns = []
-        for col in columns:
-            if col in seen:
-                seen[col] += 1
-                new_columns.append(f"{col}_{seen[col]}")
-            else:
-                seen[col] = 0
-                new_columns.append(col)
-        return pd.Index(new_columns)
-
-    def _deserialize(self, x: Any) -> Any:
-        if isinstance(x, str):
-            try:
-                return ast.literal_eval(x)
-            except (ValueError, SyntaxError):
-                pass
-        return x
+        return normalize_frame(df)
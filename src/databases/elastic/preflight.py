@@ -0,0 +1,131 @@
+import math
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .package import Package
+
+INTERVAL_MILLIS = {"ms": 1, "s": 1_000, "m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000, "M": 2_592_000_000, "q": 7_776_000_000, "y": 31_536_000_000}
+NAMED_INTERVALS = {"second": "s", "minute": "m", "hour": "h", "day": "d", "week": "w", "month": "M", "quarter": "q", "year": "y"}
+
+
+class QueryBudget:
+    """
+    Límites de costo por paquete para la verificación previa.
+
+    :param max_docs: Documentos que puede recorrer una consulta de agregaciones
+        o traer una consulta de hits.
+    :param max_buckets: Buckets que puede devolver una consulta de agregaciones.
+    :param on_exceed: ``reject`` descarta el paquete; ``sample`` lo ejecuta
+        sobre una muestra que respete ``max_docs`` cuando es posible.
+    """
+    def __init__(self, max_docs: int | None = None, max_buckets: int | None = None, on_exceed: str = "reject") -> None:
+        if on_exceed not in ("reject", "sample"):
+            raise ValueError("on_exceed debe ser 'reject' o 'sample'")
+        self.max_docs = max_docs
+        self.max_buckets = max_buckets
+        self.on_exceed = on_exceed
+
+    def evaluate(self, estimate: dict, sampleable: bool) -> tuple[str, float | None]:
+        """
+        Devuelve la acción (``run``, ``sample`` o ``reject``) y, al muestrear,
+        la probabilidad de la muestra.
+        """
+        # Las consultas de hits solo traen ``size`` documentos, no todos los que coinciden.
+        docs = estimate["hits"] if estimate["hits"] else estimate["docs"]
+        over_docs = self.max_docs is not None and docs > self.max_docs
+        over_buckets = self.max_buckets is not None and estimate["buckets"] > self.max_buckets
+        if not over_docs and not over_buckets:
+            return "run", None
+        # Muestrear reduce los documentos recorridos, no los buckets.
+        if self.on_exceed == "sample" and sampleable and over_docs and not over_buckets:
+            return "sample", self.max_docs / docs
+        return "reject", None
+
+
+def needs_probe(package: 'Package') -> bool:
+    """
+    Los conteos (``size: 0`` sin agregaciones) cuestan lo mismo que la
+    estimación, así que no se estiman.
+    """
+    query = package._query
+    if package._mode != "single" or not isinstance(query, dict):
+        return False
+    return bool(query.get("aggs", query.get("aggregations"))) or query.get("size", 10) > 0
+
+
+def probe_body(package: 'Package') -> dict:
+    """
+    Consulta ``size: 0`` que cuenta los documentos del paquete y, por cada
+    agregación terms, la cardinalidad aproximada de su campo.
+    """
+    query = package._query if isinstance(package._query, dict) else {}
+    clause = query.get("query", {"match_all": {}})
+    if "min_score" in query:
+        # En modo borrador se cuenta sobre la consulta original, no sobre la muestra.
+        clause = clause.get("function_score", {}).get("query", clause)
+    body = {"size": 0, "query": clause}
+    fields = {}
+    _collect_terms_fields(query.get("aggs", query.get("aggregations")) or {}, fields)
+    if fields:
+        body["aggs"] = {f"preflight_{name}": {"cardinality": {"field": field, "precision_threshold": 1000}} for name, field in fields.items()}
+    return body
+
+
+def estimate_cost(package: 'Package', response: dict) -> dict:
+    """
+    Estima los documentos que recorre el paquete, los buckets que devolverá y
+    los hits que traerá a partir de la respuesta de ``probe_body``.
+    """
+    total = response.get("hits", {}).get("total", 0)
+    docs = total.get("value", 0) if isinstance(total, dict) else total or 0
+    cardinalities = {
+        name[len("preflight_"):]: agg.get("value", 0)
+        for name, agg in response.get("aggregations", {}).items()
+    }
+
+    query = package._query if isinstance(package._query, dict) else {}
+    aggs = query.get("aggs", query.get("aggregations"))
+    if aggs:
+        buckets = _estimate_buckets(aggs, cardinalities, package, docs)
+        hits = 0
+    else:
+        buckets = 0
+        hits = min(docs, query.get("size", 10))
+    return {"docs": docs, "buckets": buckets, "hits": hits}
+
+
+def _collect_terms_fields(aggs: dict, fields: dict) -> None:
+    for name, agg in aggs.items():
+        if "terms" in agg and "field" in agg["terms"]:
+            fields[name] = agg["terms"]["field"]
+        sub_aggs = agg.get("aggs", agg.get("aggregations"))
+        if sub_aggs:
+            _collect_terms_fields(sub_aggs, fields)
+
+
+def _estimate_buckets(aggs: dict, cardinalities: dict, package: 'Package', docs: int) -> int:
+    total = 0
+    for name, agg in aggs.items():
+        if "terms" in agg:
+            cardinality = cardinalities.get(name, docs)
+            count = cardinality if package._complete_buckets else min(agg["terms"].get("size", 10), cardinality)
+        elif "date_histogram" in agg:
+            count = _histogram_buckets(agg["date_histogram"], package._date_range)
+        elif "composite" in agg:
+            count = docs
+        else:
+            count = 1
+        sub_aggs = agg.get("aggs", agg.get("aggregations"))
+        total += count * max(1, _estimate_buckets(sub_aggs, cardinalities, package, docs)) if sub_aggs else count
+    return min(total, docs) if docs else total
+
+
+def _histogram_buckets(histogram: dict, date_range: dict) -> int:
+    if "gte" not in date_range or "lte" not in date_range:
+        return 1
+    interval = histogram.get("fixed_interval") or histogram.get("calendar_interval") or histogram.get("interval") or "1d"
+    match = re.fullmatch(r"(\d*)(ms|[smhdwMqy])", str(interval).strip())
+    unit = match.group(2) if match else NAMED_INTERVALS.get(str(interval), "d")
+    millis = int(match.group(1) or 1) * INTERVAL_MILLIS[unit] if match else INTERVAL_MILLIS[unit]
+    return max(1, math.ceil((int(date_range["lte"]) - int(date_range["gte"]) + 1) / millis))
@@ -0,0 +1,88 @@
+import os
+import glob
+import json
+import threading
+
+from src.utils.logger import get_logger
+from .template import QueryTemplate
+
+class QueryRegistry:
+    """
+    Mantiene en memoria las consultas de Elastic de una carpeta ya compiladas.
+    Cada llamada a ``refresh`` solo vuelve a leer los archivos cuyo mtime cambió.
+    """
+    def __init__(self, folder: str) -> None:
+        self._folder = os.path.realpath(folder)
+        self._entries: dict[str, tuple[float, QueryTemplate | None]] = {}
+        self._lock = threading.Lock()
+        self.logger = get_logger()
+
+    @property
+    def folder(self) -> str:
+        return self._folder
+
+    def refresh(self) -> list[QueryTemplate]:
+        self._validate_folder_path(self._folder)
+        json_files = glob.glob(os.path.join(self._folder, "**/*.json"), recursive=True)
+
+        with self._lock:
+            entries = {}
+            for file in json_files:
+                mtime = os.path.getmtime(file)
+                cached = self._entries.get(file)
+                if cached is not None and cached[0] == mtime:
+                    entries[file] = cached
+                else:
+                    self.logger.debug(f"Cargando la consulta {file}")
+                    entries[file] = (mtime, self._compile(file))
+            self._entries = entries
+            templates = [template for _, template in entries.values() if template is not None]
+
+        self._warn_duplicate_ids(templates)
+        return templates
+
+    def templates(self) -> list[QueryTemplate]:
+        with self._lock:
+            return [template for _, template in self._entries.values() if template is not None]
+
+    def get(self, query_id: str) -> QueryTemplate | None:
+        return next((template for template in reversed(self.templates()) if template.data.get("id") == query_id), None)
+
+    def ids(self) -> list[str]:
+        return [template.data.get("id") for template in self.templates()]
+
+    def _compile(self, file: str) -> QueryTemplate | None:
+        data = self._load_json_file(file)
+        if not self._is_valid_data(data):
+            self.logger.warning(f"Formato de datos no reconocido en el archivo {file}.")
+            return None
+        try:
+            return QueryTemplate(data)
+        except KeyError as e:
+            self.logger.error(f"Error al procesar el archivo {file}: {e}")
+            return None
+
+    def _warn_duplicate_ids(self, templates: list[QueryTemplate]) -> None:
+        seen = set()
+        for template in templates:
+            query_id = template.data.get("id")
+            if query_id in seen:
+                self.logger.warning(f"El id {query_id} está repetido en {self._folder}.")
+            seen.add(query_id)
+
+    def _validate_folder_path(self, folder_path: str):
+        if not os.path.exists(folder_path):
+            raise FileNotFoundError(f"La ruta {folder_path} no existe.")
+        if not os.path.isdir(folder_path):
+            raise NotADirectoryError(f"{folder_path} no es un directorio.")
+
+    def _load_json_file(self, file: str) -> dict:
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            self.logger.error(f"Error al procesar el archivo {file}: {e}")
+            return {}
+
+    def _is_valid_data(self, data: dict) -> bool:
+        return 'query' in data and 'query' in data['query'] and 'processing_policy' in data
@@ -0,0 +1,72 @@
+import pandas as pd
+
+
+def split_epoch_range(date_range: dict, window_ms: int) -> list[dict]:
+    """
+    Divide un rango en epoch_millis en ventanas consecutivas que no se solapan.
+    """
+    if window_ms <= 0:
+        raise ValueError("La ventana debe ser mayor que cero")
+
+    windows = []
+    start, lte = date_range["gte"], date_range["lte"]
+    while start <= lte:
+        end = min(start + window_ms - 1, lte)
+        windows.append({**date_range, "gte": start, "lte": end})
+        start = end + 1
+    return windows
+
+
+def merge_slices(kind: str | None, frames: list[pd.DataFrame], total_key: str | None = None) -> pd.DataFrame:
+    """
+    Combina los resultados parciales de cada ventana en la misma forma de
+    DataFrame que devolvería Package.run() para el rango completo.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    attrs = dict(frames[0].attrs)
+
+    total = None
+    if total_key and any(total_key in frame.columns for frame in frames):
+        total = sum(pd.to_numeric(frame[total_key], errors="coerce").sum() for frame in frames if total_key in frame.columns)
+        frames = [frame.drop(columns=total_key, errors="ignore").dropna(how="all") for frame in frames]
+        frames = [frame for frame in frames if not frame.empty]
+
+    if not frames:
+        df = pd.DataFrame()
+    elif kind == "type_2":
+        df = _merge_buckets(frames)
+    elif kind == "type_3":
+        df = _merge_histograms(frames)
+    else:
+        df = pd.concat(frames, ignore_index=True)
+
+    if total is not None:
+        df = pd.concat([df, pd.DataFrame([{total_key: int(total)}])], axis=1)
+    df.attrs.update(attrs)
+    return df
+
+
+def _merge_buckets(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True)
+    if "key" not in df.columns or "doc_count" not in df.columns:
+        return df
+
+    keys = [col for col in ("key", "key_as_string") if col in df.columns]
+    aggregations = {col: "sum" if col == "doc_count" else "first" for col in df.columns if col not in keys}
+    merged = df.groupby(keys, sort=False, dropna=False).agg(aggregations).reset_index()[df.columns]
+
+    # Los histogramas se ordenan por fecha y los "terms" por número de documentos.
+    if "key_as_string" in keys:
+        return merged.sort_values("key", kind="stable", ignore_index=True)
+    return merged.sort_values("doc_count", ascending=False, kind="stable", ignore_index=True)
+
+
+def _merge_histograms(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    totals = pd.concat([frame.drop_duplicates("key")[["key", "doc_count"]] for frame in frames])
+    totals = totals.groupby("key", sort=False)["doc_count"].sum()
+
+    rows = pd.concat([frame[["key_as_string", "key"]] for frame in frames]).drop_duplicates(ignore_index=True)
+    rows["doc_count"] = rows["key"].map(totals)
+    return rows.sort_values(["doc_count", "key", "key_as_string"], ascending=[False, True, True], kind="stable", ignore_index=True)
@@ -0,0 +1,139 @@
+import os
+import json
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from elasticsearch.serializer import JSONSerializer
+from elasticsearch.connection import Urllib3HttpConnection
+
+# Tamaños de la última respuesta de la consulta en curso. Se guardan en un
+# diccionario dentro del contexto: cada hilo y cada tarea de asyncio tienen el
+# suyo, y las tareas internas del cliente asíncrono comparten el de la consulta.
+_sizes: ContextVar[dict | None] = ContextVar("response_sizes", default=None)
+
+
+class ResponseSizeSerializer(JSONSerializer):
+    """
+    Serializador JSON que recuerda el tamaño de la última respuesta
+    deserializada para poder asociarlo a la consulta que la pidió. Se mide
+    sobre el texto recibido, sin volver a codificarlo: son caracteres, que
+    coinciden con los bytes salvo en los textos no ASCII.
+    """
+    def loads(self, s):
+        _record("response_bytes", len(s))
+        return super().loads(s)
+
+
+class MeasuredConnection(Urllib3HttpConnection):
+    """
+    Conexión urllib3 que recuerda los bytes leídos del socket en la
+    última respuesta (comprimidos si se usa http_compress).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        urlopen = self.pool.urlopen
+
+        def measured_urlopen(*urlopen_args, **urlopen_kwargs):
+            response = urlopen(*urlopen_args, **urlopen_kwargs)
+            _record("wire_bytes", response.tell())
+            return response
+
+        self.pool.urlopen = measured_urlopen
+
+
+def reset_response_size() -> None:
+    _sizes.set({})
+
+
+def last_response_size() -> int | None:
+    return (_sizes.get() or {}).get("response_bytes")
+
+
+def last_wire_size() -> int | None:
+    return (_sizes.get() or {}).get("wire_bytes")
+
+
+def _record(key: str, value: int) -> None:
+    sizes = _sizes.get()
+    if sizes is not None:
+        sizes[key] = value
+
+
+def response_stats(response: dict) -> dict:
+    """
+    Extrae de una respuesta de búsqueda las métricas que reporta el servidor.
+    """
+    shards = response.get("_shards", {})
+    hits = response.get("hits", {})
+    total = hits.get("total")
+    return {
+        "took": response.get("took"),
+        "timed_out": response.get("timed_out"),
+        "shards_total": shards.get("total"),
+        "shards_successful": shards.get("successful"),
+        "shards_failed": shards.get("failed", 0),
+        "shard_failures": [failure.get("reason") for failure in shards.get("failures", [])],
+        "hits_total": total.get("value") if isinstance(total, dict) else total,
+        "hits_returned": len(hits.get("hits", [])),
+        "buckets": count_buckets(response.get("aggregations", {})),
+    }
+
+
+def count_buckets(node) -> int:
+    if isinstance(node, dict):
+        buckets = node.get("buckets")
+        if isinstance(buckets, dict):
+            buckets = list(buckets.values())
+        if isinstance(buckets, list):
+            return len(buckets) + sum(count_buckets(bucket) for bucket in buckets)
+        return sum(count_buckets(value) for value in node.values() if isinstance(value, dict))
+    return 0
+
+
+class Telemetry:
+    """
+    Acumula las métricas de ejecución de cada paquete de Elastic y las escribe
+    como un reporte JSON al final de la ejecución.
+    """
+    def __init__(self) -> None:
+        self._records: list[dict] = []
+        self._lock = threading.Lock()
+        self._started_at = datetime.now()
+
+    def record(self, stats: dict) -> None:
+        with self._lock:
+            self._records.append(stats)
+
+    @property
+    def records(self) -> list[dict]:
+        with self._lock:
+            return list(self._records)
+
+    def summary(self) -> dict:
+        records = self.records
+        return {
+            "queries": len(records),
+            "errors": sum(1 for record in records if record.get("error")),
+            "cached": sum(1 for record in records if record.get("cached")),
+            "rejected": sum(1 for record in records if record.get("rejected")),
+            "sampled": len({record["id"] for record in records if (record.get("preflight") or {}).get("action") == "sample"}),
+            "wall_time": sum(record.get("wall_time") or 0 for record in records),
+            "took": sum(record.get("took") or 0 for record in records),
+            "response_bytes": sum(record.get("response_bytes") or 0 for record in records),
+            "wire_bytes": sum(record.get("wire_bytes") or 0 for record in records),
+        }
+
+    def write(self, path: str, **metadata) -> str:
+        report = {
+            "started_at": self._started_at.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            **metadata,
+            "summary": self.summary(),
+            "queries": sorted(self.records, key=lambda record: record.get("wall_time") or 0, reverse=True),
+        }
+
+        os.makedirs(os.path.dirname(os.path.realpath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        return path
+
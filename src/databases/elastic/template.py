@@ -0,0 +1,117 @@
+from typing import Any
+
+DEFAULT_TARGET_BUCKETS = 200
+
+# Intervalos fijos de date_histogram, de menor a mayor.
+HISTOGRAM_INTERVALS = [
+    ("1m", 60_000), ("5m", 300_000), ("10m", 600_000), ("15m", 900_000), ("30m", 1_800_000),
+    ("1h", 3_600_000), ("3h", 10_800_000), ("6h", 21_600_000), ("12h", 43_200_000),
+    ("1d", 86_400_000), ("2d", 172_800_000), ("7d", 604_800_000), ("30d", 2_592_000_000),
+]
+
+
+def histogram_interval(date_range: dict, target_buckets: int = DEFAULT_TARGET_BUCKETS) -> str:
+    """
+    Elige el intervalo más pequeño de la escala que no genera más de
+    ``target_buckets`` buckets en el rango (epoch_millis).
+    """
+    span = date_range["lte"] - date_range["gte"] + 1
+    for interval, millis in HISTOGRAM_INTERVALS:
+        if span / millis <= target_buckets:
+            return interval
+    return HISTOGRAM_INTERVALS[-1][0]
+
+
+class QueryTemplate:
+    """
+    Consulta de Elastic compilada una sola vez a partir del archivo JSON.
+
+    Registra las rutas JSON donde aparecen los marcadores de fecha y de
+    Entity IDs para que ``bind`` solo tenga que reemplazar esos valores, sin
+    serializar ni volver a parsear la consulta completa.
+    """
+    def __init__(self, data: dict) -> None:
+        date_replacement = data['processing_policy']['date_range_replacement']
+        entity_replacement = data['processing_policy']['entity_ids_replacement']
+        interval_replacement = data['processing_policy'].get('interval_replacement', {})
+
+        self.data = data
+        self._gte_placeholder = date_replacement['gte_placeholder']
+        self._lte_placeholder = date_replacement['lte_placeholder']
+        self._entity_placeholder = entity_replacement['placeholder']
+        self._entity_type = entity_replacement['type']
+        self._entity_field = entity_replacement['field']
+        self._match_placeholder = [{"match": {self._entity_field: self._entity_placeholder}}]
+        self._interval_placeholder = interval_replacement.get('placeholder')
+        self.target_buckets = interval_replacement.get('target_buckets', DEFAULT_TARGET_BUCKETS)
+
+        self._slots: list[tuple[tuple, str]] = []
+        self._compile(data['query'], ())
+
+    @property
+    def has_interval(self) -> bool:
+        return any(kind == "interval" for _, kind in self._slots)
+
+    def bind(self, date_range: dict, entity_ids: list[str], interval: str | None = None) -> dict:
+        """
+        Devuelve la consulta con las fechas, los Entity IDs y el intervalo del
+        histograma sustituidos. Si no se indica ``interval`` se calcula a partir
+        de ``date_range``. Solo se copian los contenedores que llevan hasta cada
+        marcador; el resto de la consulta se comparte con la plantilla y no
+        debe modificarse.
+        """
+        if interval is None and self.has_interval:
+            interval = histogram_interval(date_range, self.target_buckets)
+
+        root = _shallow_copy(self.data['query'])
+        copied = {id(root)}
+
+        for path, kind in self._slots:
+            node = root
+            for key in path[:-1]:
+                child = node[key]
+                if id(child) not in copied:
+                    child = _shallow_copy(child)
+                    node[key] = child
+                    copied.add(id(child))
+                node = child
+            node[path[-1]] = self._render(kind, node[path[-1]], date_range, entity_ids, interval)
+
+        return root
+
+    def _compile(self, node: Any, path: tuple) -> None:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                self._compile(value, path + (key,))
+        elif isinstance(node, list):
+            if self._entity_type == "match" and node == self._match_placeholder:
+                self._slots.append((path, "match"))
+                return
+            for position, value in enumerate(node):
+                self._compile(value, path + (position,))
+        elif isinstance(node, str):
+            if self._entity_type == "term" and node == self._entity_placeholder:
+                self._slots.append((path, "terms"))
+            elif self._interval_placeholder and node == self._interval_placeholder:
+                self._slots.append((path, "interval"))
+            elif self._gte_placeholder in node or self._lte_placeholder in node or (
+                    self._entity_type == "query_string" and self._entity_placeholder in node):
+                self._slots.append((path, "text"))
+
+    def _render(self, kind: str, value: Any, date_range: dict, entity_ids: list[str], interval: str | None) -> Any:
+        if kind == "terms":
+            return {"terms": {self._entity_field: list(entity_ids)}}
+        if kind == "match":
+            return [{"match": {self._entity_field: entity_id}} for entity_id in entity_ids]
+        if kind == "interval":
+            return interval
+
+        value = value.replace(self._gte_placeholder, str(date_range['gte']))
+        value = value.replace(self._lte_placeholder, str(date_range['lte']))
+        if self._entity_type == "query_string":
+            value = value.replace(self._entity_placeholder, f'{self._entity_field}: ({" OR ".join(entity_ids)})')
+        return value
+
+
+def _shallow_copy(node: Any) -> Any:
+    return dict(node) if isinstance(node, dict) else list(node)
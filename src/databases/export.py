@@ -0,0 +1,198 @@
+import os
+import gzip
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from abc import ABC, abstractmethod
+from typing import Iterable
+
+EXPORT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+class ChunkWriter(ABC):
+    """
+    Escribe un resultado bloque a bloque sin reunirlo en memoria. El primer
+    bloque fija las columnas; los siguientes se reordenan a esas columnas. Un
+    bloque con columnas que el primero no tenía es un error: el encabezado o
+    el esquema ya están escritos y esas columnas se perderían.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rows = 0
+        self._columns: pd.Index | None = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._columns is None:
+            self._columns = df.columns
+        elif not df.columns.equals(self._columns):
+            new_columns = df.columns.difference(self._columns)
+            if len(new_columns):
+                raise ValueError(f"Columnas que no estaban en el primer bloque de {self.path}: {list(new_columns)}. Declare las columnas del resultado para fijarlas.")
+            df = df.reindex(columns=self._columns)
+        self.rows += len(df)
+        self._write(df)
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def _write(self, df: pd.DataFrame) -> None:
+        pass
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CsvChunkWriter(ChunkWriter):
+    def __init__(self, path: str, compression: str | None = None) -> None:
+        super().__init__(path)
+        self._file = None
+        self._compression = compression
+
+    def _write(self, df: pd.DataFrame) -> None:
+        header = self._file is None
+        if header:
+            opener = gzip.open if self._compression == "gzip" else open
+            self._file = opener(self.path, "wt", newline="", encoding="utf-8")
+        df.to_csv(self._file, header=header, index=False)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ArrowChunkWriter(ChunkWriter):
+    """
+    Acumula filas hasta completar ``row_group_size`` y las escribe como un
+    grupo de filas (Parquet) o un record batch (Feather). El esquema se infiere
+    del primer grupo; las columnas sin tipo se escriben como texto.
+    """
+    def __init__(self, path: str, row_group_size: int = 100_000, compression: str | None = "zstd") -> None:
+        super().__init__(path)
+        self._row_group_size = row_group_size
+        self._compression = compression
+        self._schema: pa.Schema | None = None
+        self._writer = None
+        self._buffer: list[pd.DataFrame] = []
+        self._buffered = 0
+
+    def _write(self, df: pd.DataFrame) -> None:
+        self._buffer.append(df)
+        self._buffered += len(df)
+        while self._buffered >= self._row_group_size:
+            self._flush(self._row_group_size)
+
+    def close(self) -> None:
+        if self._buffered or (self._buffer and self._schema is None):
+            self._flush(self._buffered)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _flush(self, rows: int) -> None:
+        df = pd.concat(self._buffer, ignore_index=True) if len(self._buffer) > 1 else self._buffer[0]
+        chunk, rest = df.iloc[:rows], df.iloc[rows:]
+        self._buffer = [rest] if len(rest) else []
+        self._buffered = len(rest)
+
+        if self._schema is None:
+            self._schema = _infer_schema(chunk)
+            self._writer = self._open(self._schema)
+        self._write_table(_to_table(chunk, self._schema))
+
+    @abstractmethod
+    def _open(self, schema: pa.Schema):
+        pass
+
+    @abstractmethod
+    def _write_table(self, table: pa.Table) -> None:
+        pass
+
+
+class ParquetChunkWriter(ArrowChunkWriter):
+    def _open(self, schema: pa.Schema):
+        return pq.ParquetWriter(self.path, schema, compression=self._compression or "none")
+
+    def _write_table(self, table: pa.Table) -> None:
+        self._writer.write_table(table, row_group_size=self._row_group_size)
+
+
+class FeatherChunkWriter(ArrowChunkWriter):
+    def _open(self, schema: pa.Schema):
+        options = pa.ipc.IpcWriteOptions(compression=self._compression)
+        return pa.ipc.new_file(self.path, schema, options=options)
+
+    def _write_table(self, table: pa.Table) -> None:
+        self._writer.write_table(table, max_chunksize=self._row_group_size)
+
+
+def open_chunk_writer(path: str, format: str = "csv", row_group_size: int = 100_000, compression: str | None = None) -> ChunkWriter:
+    """
+    Crea el escritor por bloques para ``format``. ``path`` no lleva extensión;
+    se agrega la del formato.
+
+    :param row_group_size: Filas por grupo (Parquet) o por record batch (Feather).
+    :param compression: ``gzip`` para CSV; ``zstd``, ``lz4``, ``snappy``... para
+        Parquet y Feather (``zstd`` por defecto).
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación no soportado: {format}")
+
+    path += EXPORT_FORMATS[format] + (".gz" if format == "csv" and compression == "gzip" else "")
+    if format == "csv":
+        return CsvChunkWriter(path, compression)
+    writer_class = ParquetChunkWriter if format == "parquet" else FeatherChunkWriter
+    return writer_class(path, row_group_size, compression or "zstd")
+
+
+def write_chunks(chunks: Iterable[pd.DataFrame], path: str, format: str = "csv", row_group_size: int = 100_000, compression: str | None = None) -> int:
+    """
+    Escribe los bloques a medida que llegan y devuelve el número de filas. Si
+    falla se elimina el archivo incompleto.
+    """
+    writer = open_chunk_writer(path, format, row_group_size, compression)
+    try:
+        with writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    except Exception:
+        if os.path.exists(writer.path):
+            os.remove(writer.path)
+        raise
+    return writer.rows
+
+
+def _infer_schema(df: pd.DataFrame) -> pa.Schema:
+    fields = []
+    for name in df.columns:
+        try:
+            field = pa.Schema.from_pandas(df[[name]], preserve_index=False).field(0)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Objetos mezclados (números y texto) que Arrow no puede tipar.
+            field = pa.field(name, pa.string())
+        fields.append(field.with_type(pa.string()) if pa.types.is_null(field.type) else field)
+    return pa.schema(fields)
+
+
+def _to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    # Un bloque posterior puede traer otro tipo en una columna: texto donde el
+    # primero no traía valores, float64 por los NaN, objetos mezclados... Se
+    # convierte con sus propios tipos y se lleva al esquema del primer bloque.
+    df = df.copy()
+    for field in schema:
+        if pa.types.is_string(field.type) and not pd.api.types.is_string_dtype(df[field.name]):
+            df[field.name] = [None if value is None or value != value else str(value) for value in df[field.name]]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False).select(schema.names).cast(schema, safe=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        mismatches = [f"{field.name} ({df[field.name].dtype}, se esperaba {field.type})" for field in schema if df[field.name].dtype != field.type.to_pandas_dtype()]
+        raise ValueError(f"Tipos distintos a los del primer bloque en {', '.join(mismatches) or 'el bloque'}: {e}") from e
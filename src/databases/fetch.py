@@ -0,0 +1,69 @@
+import datetime
+import pandas as pd
+import pyarrow as pa
+from typing import Iterator
+
+# Tipo de Python que pyodbc informa en ``cursor.description`` -> tipo de Arrow.
+ARROW_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+    datetime.time: pa.time64("us"),
+}
+
+
+def fetch_frame(cursor, batch_size: int = 10_000) -> pd.DataFrame:
+    """
+    Lee todo el resultado del cursor con ``fetchmany`` y lo convierte a un
+    DataFrame. Cada bloque de filas se pasa a columnas de Arrow y se descarta,
+    así que no se mantiene una lista con todas las filas de pyodbc.
+    """
+    columns = [column[0] for column in cursor.description]
+    tables = list(_iter_tables(cursor, batch_size))
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    return _to_pandas(pa.concat_tables(tables, promote_options="default"))
+
+
+def iter_frames(cursor, batch_size: int = 10_000) -> Iterator[pd.DataFrame]:
+    """
+    Igual que ``fetch_frame`` pero devuelve un DataFrame por bloque. Si el
+    resultado está vacío devuelve un único DataFrame vacío con las columnas.
+    """
+    empty = True
+    for table in _iter_tables(cursor, batch_size):
+        empty = False
+        yield _to_pandas(table)
+    if empty:
+        yield pd.DataFrame(columns=[column[0] for column in cursor.description])
+
+
+def _iter_tables(cursor, batch_size: int) -> Iterator[pa.Table]:
+    description = cursor.description
+    names = [column[0] for column in description]
+    types = [ARROW_TYPES.get(column[1]) for column in description]
+    while rows := cursor.fetchmany(batch_size):
+        yield pa.table([_to_array(column, arrow_type) for column, arrow_type in zip(zip(*rows), types)], names=names)
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    # Fechas en nanosegundos, como las que construía pandas a partir de las filas.
+    return table.to_pandas(coerce_temporal_nanoseconds=True)
+
+
+def _to_array(values: tuple, arrow_type: pa.DataType | None) -> pa.Array:
+    if arrow_type is not None:
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            pass
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        # Valores mezclados que Arrow no puede tipar: se guardan como texto.
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
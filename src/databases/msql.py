@@ -1,113 +1,120 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from contextlib import contextmanager
 import pandas as pd
 import pyodbc
+import json
 import sys
 import os
+from typing import Callable, Iterator
 
-from src.utils.constants import DB_HOST, DB_USER, DB_PASS
 from src.utils.logger import get_logger
+from src.databases.export import open_chunk_writer, write_chunks
+from src.databases.fetch import fetch_frame, iter_frames
+from src.databases.partials import PartialStore, split_days
+from src.databases.pool import ConnectionPool, get_pool
+
+ALARM_DURATION_COLUMNS = [
+    'EntityID', 'AlarmDate', 'DateInserted', 'GeneratedOn', 'InvestigatedOn', 'ClosedOn',
+    'AlarmName', 'MsgClassName', 'AlarmPriority', 'AlarmStatus', 'TTD', 'TTR'
+]
+
+TTD_TTR_PERCENTILES = (0.5, 0.9)
+
+# Tipos fijos de los parámetros (Entity IDs, fecha inicial, fecha final). Sin
+# ellos pyodbc declara cada uno según su valor (nvarchar(n), datetime2 con o sin
+# fracción) y SQL Server guarda un plan distinto por cada declaración.
+PARAMETER_TYPES = [(pyodbc.SQL_WLONGVARCHAR, 0, 0), (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3), (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3)]
 
 class MSQLServer:
-    def __init__(self) -> None:
-        driver = f"DRIVER={{SQL Server}};SERVER={DB_HOST};UID={DB_USER};PWD={DB_PASS}"
-        self._conn = pyodbc.connect(driver)
+    def __init__(self, partials: PartialStore | None = None, pool: ConnectionPool | None = None, fetch_size: int = 10_000) -> None:
+        self._pool = pool or get_pool()
+        self._fetch_size = fetch_size
         self._entity_ids: pd.DataFrame | None = None
 
-        self._start_date: str | None = None
-        self._end_date: str | None = None
+        self._start_date: datetime | None = None
+        self._end_date: datetime | None = None
         self.logger = get_logger()
         self._cache = {}
+        self._partials = partials
+        self._date_range: tuple[datetime, datetime] | None = None
 
     @staticmethod
-    def get_entities() -> pd.DataFrame:
+    def get_entities(pool: ConnectionPool | None = None) -> pd.DataFrame:
         sql = """
         SELECT TOP (1000) [EntityID], [ParentEntityID], [Name],
                [FullName], [ShortDesc], [RecordStatus], [DateUpdated]
         FROM [LogRhythmEMDB].[dbo].[Entity]
         """
-        driver = f"DRIVER={{SQL Server}};SERVER={DB_HOST};UID={DB_USER};PWD={DB_PASS}"
-        _conn = pyodbc.connect(driver)
-        cursor = _conn.execute(sql)
-        data = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        df = pd.DataFrame([tuple(row) for row in data], columns=columns)
-
-        _conn.close()
-        
-        return df
+        with (pool or get_pool()).connection() as conn:
+            return fetch_frame(conn.execute(sql))
 
     def get_alarm_count(self) -> int:
         self._validate_entity_ids()
         self._validate_dates()
 
-        entity_ids_str = self._get_entities_id()
-
-        sql = f"""
+        sql = """
         SELECT count(*) as Count
         FROM LogRhythm_Alarms.[dbo].[Alarm] a WITH (NOLOCK)
-        WHERE a.[EntityID] IN ({entity_ids_str}) 
-          AND DateInserted BETWEEN '{self._start_date}' AND '{self._end_date}'
+        WHERE a.[EntityID] IN (SELECT CAST([value] AS INT) FROM OPENJSON(?)) 
+          AND DateInserted BETWEEN ? AND ?
         """
-        result = self._execute_query(sql)
+        result = self._execute_query(sql, self._query_params())
         return result.iloc[0]['Count']
 
     def get_alarm_summary_by_entity_and_status(self) -> pd.DataFrame:
+        df = self._query_dataset("alarm_summary_by_entity_and_status", self._alarm_summary_by_entity_and_status_sql, self._merge_alarm_summary).copy()
+        return self._map_alarm_status(df)
+
+    def _alarm_summary_by_entity_and_status_sql(self) -> tuple[str, tuple]:
         self._validate_entity_ids()
         self._validate_dates()
 
-        entity_ids_str = self._get_entities_id()
-
-        sql = f"""
+        sql = """
         SELECT Entity.Name AS 'EntityName',
                Alarm.AlarmStatus,
                COUNT(*) AS AlarmCount
         FROM [LogRhythm_Alarms].[dbo].[Alarm] AS Alarm 
         JOIN LogRhythmEMDB.dbo.Entity AS Entity 
           ON Entity.EntityID = Alarm.EntityID
-        WHERE Entity.EntityID IN ({entity_ids_str}) 
-          AND DateInserted BETWEEN '{self._start_date}' AND '{self._end_date}'
+        WHERE Entity.EntityID IN (SELECT CAST([value] AS INT) FROM OPENJSON(?)) 
+          AND DateInserted BETWEEN ? AND ?
         GROUP BY Entity.Name, Alarm.AlarmStatus
         ORDER BY Alarm.AlarmStatus DESC
         """
-        df = self._execute_query(sql).copy()
-
-        df['AlarmStatus'] = df['AlarmStatus'].fillna(-1).astype(int).map({
-            -1: 'Unknown', 0: 'New', 1: 'OpenAlarm', 2: 'Working', 3: 'Escalated', 4: 'AutoClosed', 
-            5: 'FalsePositive', 6: 'Resolved', 7: 'UnResolved', 8: 'Reported', 9: 'Monitor'
-        })
-
-        return df
+        return sql, self._query_params()
 
     def get_alarms_information(self) -> pd.DataFrame:
+        df = self._query_dataset("latest_alarms", self._latest_alarms_sql).copy()
+        return self._map_alarm_status(df)
+
+    def _latest_alarms_sql(self) -> tuple[str, tuple]:
+        """
+        Consulta única sobre ``vw_LatestAlarms``: trae todas las columnas de la
+        vista más TTD y TTR. ``get_alarms_information`` y ``get_alarm_durations``
+        se obtienen de este mismo resultado.
+        """
         self._validate_entity_ids()
         self._validate_dates()
 
-        entity_ids_str = self._get_entities_id()
-
-        sql = f"""
+        sql = """
         SELECT *,
             DATEDIFF(SECOND, GeneratedOn, InvestigatedOn) AS TTD,
             DATEDIFF(SECOND, InvestigatedOn, ClosedOn) AS TTR
         FROM LogRhythm_Alarms.dbo.vw_LatestAlarms
-        WHERE EntityID IN ({entity_ids_str})
-          AND DateInserted BETWEEN '{self._start_date}' AND '{self._end_date}'
+        WHERE EntityID IN (SELECT CAST([value] AS INT) FROM OPENJSON(?))
+          AND DateInserted BETWEEN ? AND ?
         """
-        df = self._execute_query(sql).copy()
-        
-        df['AlarmStatus'] = df['AlarmStatus'].fillna(-1).astype(int).map({
-            -1: 'Unknown', 0: 'New', 1: 'OpenAlarm', 2: 'Working', 3: 'Escalated', 4: 'AutoClosed', 
-            5: 'FalsePositive', 6: 'Resolved', 7: 'UnResolved', 8: 'Reported', 9: 'Monitor'
-        })
-
-        return df
+        return sql, self._query_params()
 
     def get_full_alarm_details(self) -> pd.DataFrame:
+        df = self._query_dataset("full_alarm_details", self._full_alarm_details_sql).copy()
+        return self._map_alarm_status(df)
+
+    def _full_alarm_details_sql(self) -> tuple[str, tuple]:
         self._validate_entity_ids()
         self._validate_dates()
 
-        entity_ids_str = self._get_entities_id()
-
-        sql = f"""
+        sql = """
         SELECT alm.[EntityID],
                alm.[AlarmDate],
                alm.[DateInserted],
@@ -123,112 +130,240 @@ class MSQLServer:
           ON alm.[AlarmID] = atm.[AlarmID]
         JOIN [LogRhythm_Events].[dbo].[Msg] lrem WITH (NOLOCK)
           ON lrem.[MsgID] = atm.[MARCMsgID]
-        WHERE alm.[EntityID] IN ({entity_ids_str})
-          AND alm.[DateInserted] BETWEEN '{self._start_date}' AND '{self._end_date}'
+        WHERE alm.[EntityID] IN (SELECT CAST([value] AS INT) FROM OPENJSON(?))
+          AND alm.[DateInserted] BETWEEN ? AND ?
         """
-        df = self._execute_query(sql).copy()
-        
-        df['AlarmStatus'] = df['AlarmStatus'].fillna(-1).astype(int).map({
-            -1: 'Unknown', 0: 'New', 1: 'OpenAlarm', 2: 'Working', 3: 'Escalated', 4: 'AutoClosed', 
-            5: 'FalsePositive', 6: 'Resolved', 7: 'UnResolved', 8: 'Reported', 9: 'Monitor'
-        })
-
-        return df
+        return sql, self._query_params()
 
     def get_alarm_durations(self) -> pd.DataFrame:
+        return self._alarm_durations(self.get_alarms_information())
+
+    @staticmethod
+    def _alarm_durations(df: pd.DataFrame) -> pd.DataFrame:
+        return df.rename(columns={'AlarmRuleName': 'AlarmName'})[ALARM_DURATION_COLUMNS]
+    
+    def get_TTD_AND_TTR_by_alarm_priority(self) -> pd.DataFrame:
+        return self._ttd_ttr_summary('AlarmPriority', 'Priority')
+    
+    def get_TTD_AND_TTR_by_msg_class_name(self) -> pd.DataFrame:
+        return self._ttd_ttr_summary('MsgClassName', 'MsgClassName')
+
+    def _ttd_ttr_summary(self, group_column: str, name: str) -> pd.DataFrame:
+        """
+        Resumen de TTD y TTR (conteo, promedio, máximo y percentiles) por
+        ``group_column``. Se calcula en SQL Server y solo viajan las filas del
+        resumen; en modo incremental se calcula sobre las filas de los parciales.
+        """
+        if self._partials is not None and self._date_range is not None:
+            return self._summarize_durations(self.get_alarm_durations(), group_column, name)
+        return self._execute_query(*self._ttd_ttr_summary_sql(group_column, name))
+
+    def _ttd_ttr_summary_sql(self, group_column: str, name: str) -> tuple[str, tuple]:
         self._validate_entity_ids()
         self._validate_dates()
 
-        entity_ids_str = self._get_entities_id()
+        percentiles = ",\n                   ".join(
+            f"PERCENTILE_CONT({quantile}) WITHIN GROUP (ORDER BY {metric}) OVER (PARTITION BY GroupKey) AS P{int(quantile * 100)}_{metric}"
+            for metric in ("TTD", "TTR") for quantile in TTD_TTR_PERCENTILES
+        )
+        percentile_columns = ", ".join(f"p.P{int(quantile * 100)}_{metric}" for metric in ("TTD", "TTR") for quantile in TTD_TTR_PERCENTILES)
 
+        # PERCENTILE_CONT solo existe como función de ventana, así que los
+        # percentiles se calculan aparte y se unen al resumen del GROUP BY.
         sql = f"""
-        SELECT 
-            EntityID,
-            AlarmDate,
-            DateInserted,
-            GeneratedOn,
-            InvestigatedOn,
-            ClosedOn,
-            AlarmRuleName AS AlarmName,
-            MsgClassName,
-            AlarmPriority,
-            AlarmStatus,
-            DATEDIFF(SECOND, GeneratedOn, InvestigatedOn) AS TTD,
-            DATEDIFF(SECOND, InvestigatedOn, ClosedOn) AS TTR
-        FROM LogRhythm_Alarms.dbo.vw_LatestAlarms
-        WHERE EntityID IN ({entity_ids_str})
-          AND DateInserted BETWEEN '{self._start_date}' AND '{self._end_date}'
+        WITH Durations AS (
+            SELECT {group_column} AS GroupKey,
+                   EntityID,
+                   DATEDIFF(SECOND, GeneratedOn, InvestigatedOn) AS TTD,
+                   DATEDIFF(SECOND, InvestigatedOn, ClosedOn) AS TTR
+            FROM LogRhythm_Alarms.dbo.vw_LatestAlarms
+            WHERE EntityID IN (SELECT CAST([value] AS INT) FROM OPENJSON(?))
+              AND DateInserted BETWEEN ? AND ?
+              AND {group_column} IS NOT NULL
+        ),
+        Summary AS (
+            SELECT GroupKey,
+                   COUNT(EntityID) AS Count,
+                   AVG(CAST(TTD AS FLOAT)) AS Avg_TTD,
+                   MAX(TTD) AS Max_TTD,
+                   AVG(CAST(TTR AS FLOAT)) AS Avg_TTR,
+                   MAX(TTR) AS Max_TTR
+            FROM Durations
+            GROUP BY GroupKey
+        ),
+        Percentiles AS (
+            SELECT DISTINCT GroupKey,
+                   {percentiles}
+            FROM Durations
+        )
+        SELECT s.GroupKey AS {name},
+               s.Count, s.Avg_TTD, s.Max_TTD, s.Avg_TTR, s.Max_TTR,
+               {percentile_columns}
+        FROM Summary s
+        JOIN Percentiles p ON p.GroupKey = s.GroupKey
+        ORDER BY s.GroupKey
         """
-        df = self._execute_query(sql).copy()
-        
-        df['AlarmStatus'] = df['AlarmStatus'].fillna(-1).astype(int).map({
-            -1: 'Unknown', 0: 'New', 1: 'OpenAlarm', 2: 'Working', 3: 'Escalated', 4: 'AutoClosed', 
-            5: 'FalsePositive', 6: 'Resolved', 7: 'UnResolved', 8: 'Reported', 9: 'Monitor'
-        })
-        
-        return df
-    
-    def get_TTD_AND_TTR_by_alarm_priority(self) -> pd.DataFrame:
-        df = self.get_alarm_durations()
-        summary = df.groupby('AlarmPriority').agg(
-            Tickets=('EntityID', 'count'),
-            Avg_TTD=('TTD', 'mean'),
-            Max_TTD=('TTD', 'max'),
-            Avg_TTR=('TTR', 'mean'),
-            Max_TTR=('TTR', 'max')
-        ).reset_index()
-        summary.columns = ['Priority', 'Count', 'Avg_TTD', 'Max_TTD', 'Avg_TTR', 'Max_TTR']
-        return summary
-    
-    def get_TTD_AND_TTR_by_msg_class_name(self) -> pd.DataFrame:
-        df = self.get_alarm_durations()
-        summary = df.groupby('MsgClassName').agg(
-            Tickets=('EntityID', 'count'),
+        return sql, self._query_params()
+
+    @staticmethod
+    def _summarize_durations(df: pd.DataFrame, group_column: str, name: str) -> pd.DataFrame:
+        # Las columnas con NULL llegan como object y quantile solo acepta números.
+        df = df.assign(TTD=pd.to_numeric(df['TTD']), TTR=pd.to_numeric(df['TTR']))
+        grouped = df.groupby(group_column)
+        summary = grouped.agg(
+            Count=('EntityID', 'count'),
             Avg_TTD=('TTD', 'mean'),
             Max_TTD=('TTD', 'max'),
             Avg_TTR=('TTR', 'mean'),
             Max_TTR=('TTR', 'max')
-        ).reset_index()
-
-        summary.columns = ['MsgClassName', 'Count', 'Avg_TTD', 'Max_TTD', 'Avg_TTR', 'Max_TTR']
-        return summary
+        )
+        for metric in ("TTD", "TTR"):
+            for quantile in TTD_TTR_PERCENTILES:
+                summary[f"P{int(quantile * 100)}_{metric}"] = grouped[metric].quantile(quantile)
+        return summary.reset_index().rename(columns={group_column: name})
     
     def export_to_csv(self, directory: str) -> None:
+        self.export(directory, "csv")
+
+    def export(self, directory: str, format: str = "csv", row_group_size: int = 100_000, chunk_size: int = 10_000, compression: str | None = None) -> None:
+        """
+        Exporta cada conjunto de datos a CSV, Parquet o Feather. Las consultas
+        de detalle se leen del cursor en bloques de ``chunk_size`` filas y se
+        escriben a medida que llegan, sin reunir el resultado en memoria.
+        """
         if not os.path.exists(directory):
             os.makedirs(directory, exist_ok=True)
         
         functions_to_export = {
-            "entities": self.get_entities,
-            "alarm_summary_by_entity_and_status": self.get_alarm_summary_by_entity_and_status,
-            "alarms_information": self.get_alarms_information,
-            "full_alarm_details": self.get_full_alarm_details,
-            "alarm_durations": self.get_alarm_durations,
-            "TTD_AND_TTR_by_alarm_priority": self.get_TTD_AND_TTR_by_alarm_priority,
-            "TTD_AND_TTR_by_msg_class_name": self.get_TTD_AND_TTR_by_msg_class_name
+            "entities": lambda: [self.get_entities()],
+            "alarm_summary_by_entity_and_status": lambda: [self.get_alarm_summary_by_entity_and_status()],
+            "full_alarm_details": lambda: self._iter_alarm_dataset("full_alarm_details", self._full_alarm_details_sql, chunk_size),
+            "TTD_AND_TTR_by_alarm_priority": lambda: [self.get_TTD_AND_TTR_by_alarm_priority()],
+            "TTD_AND_TTR_by_msg_class_name": lambda: [self.get_TTD_AND_TTR_by_msg_class_name()]
         }
         
         for file_name, func in functions_to_export.items():
             self.logger.info(f"Exportando {file_name}")
-            df = func()
-            df.to_csv(os.path.join(directory, f"{file_name}.csv"), index=False)
+            write_chunks(func(), os.path.join(directory, file_name), format, row_group_size, compression)
+
+        # alarms_information y alarm_durations salen del mismo recorrido de vw_LatestAlarms.
+        self.logger.info("Exportando alarms_information y alarm_durations")
+        with open_chunk_writer(os.path.join(directory, "alarms_information"), format, row_group_size, compression) as information, \
+             open_chunk_writer(os.path.join(directory, "alarm_durations"), format, row_group_size, compression) as durations:
+            for df in self._iter_alarm_dataset("latest_alarms", self._latest_alarms_sql, chunk_size):
+                information.write(df)
+                durations.write(self._alarm_durations(df))
 
     # ==========================================
     # Private methods
     # ==========================================
 
-    def _execute_query(self, sql: str) -> pd.DataFrame:
-        cache_key = (sql, self._get_entities_id(), self._start_date, self._end_date)
+    def _execute_query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        cache_key = (sql, params)
         if cache_key in self._cache:
             return self._cache[cache_key]
         
-        cursor = self._conn.execute(sql)
-        data = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        df = pd.DataFrame([tuple(row) for row in data], columns=columns)
+        df = self._fetch_all(sql, params)
         self._cache[cache_key] = df
         
         return df
 
+    @staticmethod
+    def _execute(conn: pyodbc.Connection, sql: str, params: tuple) -> pyodbc.Cursor:
+        cursor = conn.cursor()
+        if params:
+            cursor.setinputsizes(PARAMETER_TYPES[:len(params)])
+        return cursor.execute(sql, *params)
+
+    def _fetch_all(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._pool.connection() as conn:
+            return fetch_frame(self._execute(conn, sql, params), self._fetch_size)
+
+    def _query_dataset(self, name: str, sql_builder: Callable[[], tuple[str, tuple]], merge: Callable[[list[pd.DataFrame]], pd.DataFrame] | None = None) -> pd.DataFrame:
+        """
+        Ejecuta la consulta de un conjunto de datos. En modo incremental se
+        arma con los parciales de cada día y se combina con ``merge`` (por
+        defecto, concatenando las filas).
+        """
+        if self._partials is None or self._date_range is None:
+            return self._execute_query(*sql_builder())
+
+        cache_key = (name, self._get_entities_id(), self._start_date, self._end_date)
+        if cache_key not in self._cache:
+            frames = list(self._iter_partials(name, sql_builder))
+            self._cache[cache_key] = merge(frames) if merge else pd.concat(frames, ignore_index=True)
+        return self._cache[cache_key]
+
+    def _iter_partials(self, name: str, sql_builder: Callable[[], tuple[str, tuple]]) -> Iterator[pd.DataFrame]:
+        """
+        Devuelve el resultado día por día. Los días definitivos se leen del
+        almacén de parciales si existen y se guardan al consultarlos.
+        """
+        for day_start, day_end in split_days(*self._date_range, resolution=timedelta(milliseconds=3)):
+            with self._date_window(day_start, day_end):
+                sql, params = sql_builder()
+            key = {"dataset": name, "sql": sql, "params": params, "entity_ids": self._get_entities_id()}
+            final = self._partials.is_final(day_end)
+            df = self._partials.get("msql", key) if final else None
+            if df is None:
+                df = self._fetch_all(sql, params)
+                if final:
+                    self._partials.put("msql", key, df)
+            yield df
+
+    @contextmanager
+    def _date_window(self, start_date: datetime, end_date: datetime):
+        saved = self._start_date, self._end_date
+        self._start_date, self._end_date = self._to_sql_datetime(start_date), self._to_sql_datetime(end_date)
+        try:
+            yield
+        finally:
+            self._start_date, self._end_date = saved
+
+    @staticmethod
+    def _to_sql_datetime(date: datetime) -> datetime:
+        # Los parámetros se declaran con milisegundos, como la columna datetime.
+        return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+    @staticmethod
+    def _merge_alarm_summary(frames: list[pd.DataFrame]) -> pd.DataFrame:
+        df = pd.concat(frames, ignore_index=True)
+        df = df.groupby(['EntityName', 'AlarmStatus'], sort=False, dropna=False)['AlarmCount'].sum().reset_index()
+        return df.sort_values('AlarmStatus', ascending=False, kind='stable', ignore_index=True)
+
+    def _iter_query(self, sql: str, params: tuple, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        Lee el resultado del cursor en bloques de ``chunk_size`` filas. Si la
+        consulta ya está en la caché se recorre la copia en memoria.
+        """
+        cache_key = (sql, params)
+        if cache_key in self._cache:
+            df = self._cache[cache_key]
+            for start in range(0, max(len(df), 1), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+            return
+
+        # La conexión queda prestada mientras se recorre el cursor.
+        with self._pool.connection() as conn:
+            cursor = self._execute(conn, sql, params)
+            try:
+                yield from iter_frames(cursor, chunk_size)
+            finally:
+                cursor.close()
+
+    def _iter_alarm_dataset(self, name: str, sql_builder: Callable[[], tuple[str, tuple]], chunk_size: int) -> Iterator[pd.DataFrame]:
+        chunks = self._iter_partials(name, sql_builder) if self._partials is not None and self._date_range else self._iter_query(*sql_builder(), chunk_size)
+        for df in chunks:
+            yield self._map_alarm_status(df.copy())
+
+    @staticmethod
+    def _map_alarm_status(df: pd.DataFrame) -> pd.DataFrame:
+        df['AlarmStatus'] = df['AlarmStatus'].fillna(-1).astype(int).map({
+            -1: 'Unknown', 0: 'New', 1: 'OpenAlarm', 2: 'Working', 3: 'Escalated', 4: 'AutoClosed', 
+            5: 'FalsePositive', 6: 'Resolved', 7: 'UnResolved', 8: 'Reported', 9: 'Monitor'
+        })
+        return df
+
     def _validate_entity_ids(self):
         if self._entity_ids is None or self._entity_ids.empty:
             print("Error: Se llamó a la base de datos sin setear los Entity IDs")
@@ -246,12 +381,19 @@ class MSQLServer:
         self._cache.clear()
 
     def set_date_range(self, start_date: datetime, end_date: datetime) -> None:
-        self._start_date = start_date.strftime('%Y-%m-%dT%H:%M:%SZ')
-        self._end_date = end_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+        self._date_range = (start_date, end_date)
+        self._start_date = self._to_sql_datetime(start_date)
+        self._end_date = self._to_sql_datetime(end_date)
         self._cache.clear()
 
-    def _get_entities_id(self) -> str:
+    def _query_params(self) -> tuple[str, datetime, datetime]:
+        # Los Entity IDs van en un único parámetro, como arreglo JSON que la
+        # consulta lee con OPENJSON; con los tipos de PARAMETER_TYPES, ni el
+        # texto ni la declaración cambian entre entidades y fechas, y SQL Server
+        # reutiliza el plan.
+        return json.dumps(self._get_entities_id()), self._start_date, self._end_date
+
+    def _get_entities_id(self) -> tuple[int, ...]:
         if self._entity_ids is None:
-            return ""
-        entity_ids = self._entity_ids['EntityID'].tolist()
-        return ', '.join(map(str, entity_ids))
+            return ()
+        return tuple(sorted(set(int(entity_id) for entity_id in self._entity_ids['EntityID'])))
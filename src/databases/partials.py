@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+import pandas as pd
+from datetime import datetime, time, timedelta
+
+from src.utils.logger import get_logger
+
+
+class PartialStore:
+    """
+    Resultados parciales por día guardados en disco (Parquet) para los
+    reportes incrementales.
+
+    Solo se guardan los días que ya no pueden cambiar (terminaron hace más de
+    ``settle``). Una ejecución posterior lee esos días del disco y solo
+    consulta los que faltan o aún no son definitivos.
+    """
+    def __init__(self, directory: str = "./output/partials", settle: timedelta = timedelta(days=2)) -> None:
+        self._directory = os.path.realpath(directory)
+        self._settle = settle
+        self.logger = get_logger()
+
+        os.makedirs(self._directory, exist_ok=True)
+
+    def is_final(self, day_end: datetime) -> bool:
+        return day_end < datetime.now(day_end.tzinfo) - self._settle
+
+    def get(self, namespace: str, key: dict) -> pd.DataFrame | None:
+        path = self._path(namespace, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            self.logger.warning(f"No se pudo leer el parcial {path}: {e}")
+            os.remove(path)
+            return None
+
+    def put(self, namespace: str, key: dict, df: pd.DataFrame) -> None:
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False, compression="zstd")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.debug(f"El parcial de {namespace} no se puede guardar: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self, namespace: str | None = None) -> None:
+        directory = os.path.join(self._directory, namespace) if namespace else self._directory
+        for root, _, files in os.walk(directory):
+            for file in files:
+                if file.endswith(".parquet"):
+                    os.remove(os.path.join(root, file))
+
+    def _path(self, namespace: str, key: dict) -> str:
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, namespace, f"{digest}.parquet")
+
+
+def split_days(start: datetime, end: datetime, resolution: timedelta = timedelta(milliseconds=1)) -> list[tuple[datetime, datetime]]:
+    """
+    Divide un rango en días naturales (de medianoche a medianoche). Cada día
+    termina ``resolution`` antes de la medianoche siguiente para que los
+    rangos inclusivos no se solapen; el primer y el último día se recortan al
+    rango pedido.
+    """
+    days = []
+    day_start = start
+    while day_start <= end:
+        next_day = datetime.combine(day_start.date() + timedelta(days=1), time.min, tzinfo=day_start.tzinfo)
+        days.append((day_start, min(end, next_day - resolution)))
+        day_start = next_day
+    return days
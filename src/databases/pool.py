@@ -0,0 +1,168 @@
+import time
+import threading
+import pyodbc
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.utils.constants import DB_HOST, DB_USER, DB_PASS
+from src.utils.logger import get_logger
+
+CONNECTION_STRING = f"DRIVER={{SQL Server}};SERVER={DB_HOST};UID={DB_USER};PWD={DB_PASS}"
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones ``pyodbc`` compartido por todas las consultas a SQL
+    Server, para no repetir el inicio de sesión TDS en cada consulta.
+
+    :param max_size: Conexiones abiertas como máximo (prestadas y libres).
+    :param max_idle: Segundos que una conexión libre puede esperar antes de cerrarse.
+    :param check_after: Segundos de inactividad tras los cuales una conexión se
+        verifica con ``SELECT 1`` antes de prestarla.
+    :param timeout: Segundos que se espera una conexión libre cuando el pool está lleno.
+    """
+    def __init__(self, connection_string: str = CONNECTION_STRING, max_size: int = 4, max_idle: float = 300, check_after: float = 30, timeout: float = 60) -> None:
+        if max_size < 1:
+            raise ValueError("max_size debe ser mayor o igual a 1")
+        self._connection_string = connection_string
+        self._max_size = max_size
+        self._max_idle = max_idle
+        self._check_after = check_after
+        self._timeout = timeout
+        self._idle: list[tuple[pyodbc.Connection, float]] = []
+        self._opened = 0
+        self._condition = threading.Condition()
+        self.logger = get_logger()
+
+    @contextmanager
+    def connection(self) -> Iterator[pyodbc.Connection]:
+        """
+        Presta una conexión durante el bloque ``with`` y la devuelve al pool al
+        salir. Si el bloque falla y la conexión ya no responde, se descarta.
+        """
+        conn = self._acquire()
+        healthy = True
+        try:
+            yield conn
+        except Exception:
+            healthy = self._is_alive(conn)
+            raise
+        finally:
+            self._release(conn, healthy)
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _acquire(self) -> pyodbc.Connection:
+        deadline = time.monotonic() + self._timeout
+        while True:
+            with self._condition:
+                self._expire_idle()
+                if self._idle:
+                    conn, released = self._idle.pop()
+                elif self._opened < self._max_size:
+                    self._opened += 1
+                    conn, released = None, None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(f"No hay conexiones libres con SQL Server después de {self._timeout} segundos")
+                    self._condition.wait(remaining)
+                    continue
+
+            if conn is None:
+                return self._open()
+            if time.monotonic() - released < self._check_after or self._is_alive(conn):
+                return conn
+            self.logger.debug("Conexión con SQL Server inactiva descartada")
+            self._discard(conn)
+
+    def _release(self, conn: pyodbc.Connection, healthy: bool) -> None:
+        if not healthy:
+            self._discard(conn)
+            return
+        try:
+            # Cierra la transacción implícita que abre pyodbc sin autocommit.
+            conn.rollback()
+        except pyodbc.Error:
+            self._discard(conn)
+            return
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def _open(self) -> pyodbc.Connection:
+        try:
+            return pyodbc.connect(self._connection_string)
+        except Exception:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+            raise
+
+    def _discard(self, conn: pyodbc.Connection) -> None:
+        self._close(conn)
+        with self._condition:
+            self._opened -= 1
+            self._condition.notify()
+
+    def _expire_idle(self) -> None:
+        # Se llama con el lock tomado; las conexiones más antiguas están al principio.
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self._max_idle:
+            conn, _ = self._idle.pop(0)
+            self._opened -= 1
+            self._close(conn)
+
+    @staticmethod
+    def _is_alive(conn: pyodbc.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _close(conn: pyodbc.Connection) -> None:
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(**options) -> ConnectionPool:
+    """
+    Reemplaza el pool del proceso por uno nuevo con ``options`` (ver
+    ``ConnectionPool``). Debe llamarse antes de la primera consulta.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(**options)
+        return _pool
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None